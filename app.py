@@ -1,26 +1,104 @@
+import asyncio
 import os
 import pandas as pd
 import streamlit as st
 import altair as alt
 import random
-import subprocess
-import sys
 from datetime import datetime, timedelta
-from time import sleep
+from time import sleep, perf_counter
+from model_registry import get_model_predictor, model_names, active_model, compare_models
+from ble_device import default_device
+from ble_session import BleSessionManager
+from ble_hub import BleHub, load_device_config, load_sampling_rates, DEVICES_FILE
+from pipeline import MeasurementPipeline
+from measurement_store import open_store, COLUMNS
+from measure_journal import open_journal
+from prediction_cache import PredictionCache
+from ingest_index import IngestIndex
+from downsampling import CHART_WIDTH, MIN_BAR_PIXELS, downsample, bin_counts
+from time_window import sort_by_time, between, since
+
+# Predictors come from the model registry: each model is loaded the first time
+# it is selected and stays loaded, so switching between them costs nothing
+@st.cache_resource
+def get_predictor(model_name):
+    return get_model_predictor(model_name)
+
+# Model chosen in the sidebar
+def selected_model():
+    return st.session_state.get('model', active_model())
+
+# The BLE connection stays open in the background and is shared across reruns
+@st.cache_resource
+def get_ble_session():
+    return BleSessionManager(default_device()).start()
+
+# Indexed measurement store, migrated from data.csv on first use
+@st.cache_resource
+def get_store():
+    return open_store()
+
+# Ward hub, only when a devices.json lists the sensors to poll. The sensor the
+# BLE session is connected to is requested through the session.
+@st.cache_resource
+def get_ble_hub():
+    session = get_ble_session()
+    return BleHub(load_device_config(DEVICES_FILE), sessions={session.device.address: session})
+
+# Pending measures live in an append-only journal. Named measures left
+# uncommitted by a crash are written to the store when it is opened.
+@st.cache_resource
+def get_journal():
+    journal = open_journal()
+    append_measurements(journal, get_store())
+    return journal
+
+# Results of stored measures already predicted once, reused when a device
+# sends them again
+@st.cache_resource
+def get_prediction_cache():
+    return PredictionCache()
+
+# Record ids of the stored measures already taken in, so history a device
+# sends again is dropped before preprocessing
+@st.cache_resource
+def get_ingest_index():
+    return IngestIndex()
+
+# Acquisition, preprocessing and prediction run in-process; only the pending
+# measures are persisted, in the journal. Device sampling rates come from devices.json.
+@st.cache_resource
+def get_new_measure_pipeline(model_name):
+    return MeasurementPipeline(get_predictor(model_name), sampling_rates=load_sampling_rates())
+
+@st.cache_resource
+def get_request_pipeline(model_name):
+    return MeasurementPipeline(get_predictor(model_name), journal=get_journal(), sampling_rates=load_sampling_rates(),
+                               cache=get_prediction_cache(), ingest_index=get_ingest_index())
+
+# Raised when the device is off or out of range: the session gives up after
+# its connect timeout
+BLE_ERRORS = (ConnectionError, asyncio.TimeoutError)
 
 # Function to communicate with BLE device
 def ble_new_measure():
-    subprocess.run([sys.executable, "ble_new_measure.py"])
-    subprocess.run([sys.executable, "bp_new_predict.py"])
-    df_result = pd.read_csv("new_measure.csv")
-    return df_result
-
+    try:
+        return get_new_measure_pipeline(selected_model()).run_new_measure(get_ble_session())
+    except BLE_ERRORS as e:
+        st.warning(f"Dispositivo não encontrado, verifique se está ligado e por perto ({e})")
+        return None
+
+# The ingest index is saved after each transfer so the next start loads it
+# instead of rebuilding it from its table
 def ble_request_measures():
-    subprocess.run([sys.executable, "ble_request_measures.py"])
-    subprocess.run([sys.executable, "bp_request_predicts.py"])
-    df_requested_measures = pd.read_csv("requested_measures.csv")
-    df_requested_measures['Name'] = df_requested_measures['Name'].astype(str)
-    return df_requested_measures
+    source = get_ble_hub() if os.path.exists(DEVICES_FILE) else get_ble_session()
+    try:
+        return get_request_pipeline(selected_model()).run_request_measures(source)
+    except BLE_ERRORS as e:
+        st.warning(f"Dispositivo não encontrado, verifique se está ligado e por perto ({e})")
+        return []
+    finally:
+        get_ingest_index().save()
 
 # Set page configuration
 st.set_page_config(
@@ -29,95 +107,76 @@ st.set_page_config(
     layout="wide",  # Set layout to wide
 )
 
-# Load data from CSV file
-def load_data(file_path):
-    return pd.read_csv(file_path)
+# Dashboard aggregates are maintained by the store on every append and cached
+# per store version, so reruns do not touch the measurement history
+RECENT_ROWS = 1000
 
-# Save data to CSV
-def save_data(df, file_path):
-    df.to_csv(file_path, index=False)
+@st.cache_data
+def load_category_counts(version, patient_id=None):
+    return get_store().category_counts(patient_id)
 
-# Write data to CSV file
-def write_to_csv(file_path, measurement):
-    if os.path.exists(file_path):
-        data = pd.read_csv(file_path)
-    else:
-        data = pd.DataFrame(columns=['Id', 'Name', 'Date_of_Measurement', 'Systolic_Pressure', 'Diastolic_Pressure'])
-    data = data._append(measurement, ignore_index=True)
-    data.to_csv(file_path, index=False)
+@st.cache_data
+def load_hourly_counts(version):
+    return sort_by_time(get_store().hourly_counts(), 'Hour')
+
+@st.cache_data
+def load_recent_measurements(version, limit=RECENT_ROWS):
+    return get_store().recent(limit)
 
-# Define blood pressure categories and color scheme
-BP_CATEGORIES = {'Baixa': {'min_systolic': 0, 'max_systolic': 100, 'min_diastolic': 0, 'max_diastolic': 90},
-                  'Normal': {'min_systolic': 90, 'max_systolic': 120, 'min_diastolic': 70, 'max_diastolic': 80},
-                  'Alta': {'min_systolic': 130, 'max_systolic': float('inf'), 'min_diastolic': 90, 'max_diastolic': float('inf')}}
-COLOR_SCHEME = {'Baixa': '#CAF4FF', 'Normal': '#5AB2FF', 'Alta': '#FF8080'}
+# A patient's history, parsed and sorted by date once per store version. Shared
+# without copying (cache_resource), so callers only take slices of it.
+@st.cache_resource(max_entries=32)
+def load_patient_measurements(version, patient_id):
+    return sort_by_time(get_store().query_patient(patient_id), 'Date_of_Measurement')
+
+# Append a measurement to the store
+def write_measurement(measurement):
+    get_store().append(measurement)
 
 # Function to generate a new measurement
-def get_new_measurement(name, data):
-    # Get the existing ID for the given name or assign a new ID if the name is not found
-    if name in data['Name'].values:
-        patient_id = data[data['Name'] == name]['Id'].iloc[0]
-    else:
-        patient_id = data['Id'].max() + 1
-    
-    # Run the BLE communication script
-    df_result = ble_new_measure()
+def get_new_measurement(name, store):
+    # Take the reading from the BLE device
+    result = ble_new_measure()
+    if result is None:
+        return None
+
+    # Get the existing ID for the given name or register the patient with a new ID
+    patient_id = store.patients.get_or_create(name)
 
     # Create a new measurement record
     new_measurement = {
         'Id': patient_id,
         'Name': name,
-        'Date_of_Measurement': df_result['Date_of_Measurement'][0],
-        'Systolic_Pressure': df_result['Systolic_Pressure'][0],
-        'Diastolic_Pressure': df_result['Diastolic_Pressure'][0],
+        'Date_of_Measurement': result.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'Systolic_Pressure': result.systolic,
+        'Diastolic_Pressure': result.diastolic,
     }
     return new_measurement
 
-def append_measurements():
-    # Load the full dataset
-    data_df = load_data("data.csv")
-    processed_measures_df = load_data("processed_measures.csv")
-
-    # Ensure 'Name' column is treated as strings
-    data_df['Name'] = data_df['Name'].astype(str)
-    processed_measures_df['Name'] = processed_measures_df['Name'].astype(str)
+# Move the named measures of the journal to the store. The store skips record
+# ids it already has and the journal only then marks them committed, so a
+# crash at any point is repaired by running this again.
+def append_measurements(journal, store):
+    processed_measures_df = journal.named()
+    if processed_measures_df.empty:
+        return
 
-    # Create a dictionary to map names to IDs
-    name_to_id = dict(zip(data_df['Name'], data_df['Id']))
-
-    # Find the highest existing ID
-    if not data_df.empty:
-        highest_id = data_df['Id'].max()
-    else:
-        highest_id = 0
-
-    # Assign IDs to the processed measures
-    new_ids = []
-    for name in processed_measures_df['Name']:
-        if name in name_to_id:
-            new_ids.append(name_to_id[name])
-        else:
-            highest_id += 1
-            name_to_id[name] = highest_id
-            new_ids.append(highest_id)
+    # Assign IDs to the processed measures, registering new patients
+    new_ids = store.patients.assign_ids(processed_measures_df['Name'].tolist())
 
     # Create a DataFrame with IDs and other columns from processed measures
-    processed_with_ids_df = processed_measures_df.copy()
+    # (the source device is only needed while a measure is pending)
+    processed_with_ids_df = processed_measures_df.drop(columns=['Device'])
     processed_with_ids_df['Id'] = new_ids
 
-    # Append the processed measures to the main data DataFrame
-    data_df = data_df._append(processed_with_ids_df, ignore_index=True)
-    
-    # Save the updated data DataFrame
-    save_data(data_df, "data.csv")
-
-    # Clear the processed measures file
-    processed_measures_df = processed_measures_df.iloc[0:0]
-    processed_measures_df.to_csv("processed_measures.csv", index=False, header=True)
+    # Append the processed measures to the store, then close them in the journal
+    store.append(processed_with_ids_df[COLUMNS + ['Record_Id']])
+    journal.mark_committed(processed_with_ids_df['Record_Id'])
 
 def get_column_config(config_type):
     if config_type == 1:
         return {
+            "Record_Id": None,  # Hidden, identifies the measure in the journal
             "Name": st.column_config.Column(
                 "Nome",
                 width=None,
@@ -137,7 +196,18 @@ def get_column_config(config_type):
                 "Pressão Sistólica",
                 width=None,
                 required=True,
-            )
+            ),
+            "Device": st.column_config.Column(
+                "Dispositivo",
+                width=None,
+                disabled=True,
+            ),
+            "Quality": st.column_config.ProgressColumn(
+                "Qualidade do sinal",
+                min_value=0,
+                max_value=1,
+                format="%.2f",
+            ),
         }
     elif config_type == 2:
         return {
@@ -160,48 +230,35 @@ def get_column_config(config_type):
     else:
         return {}
 
-# Categorize blood pressure readings
-def categorize_blood_pressure(systolic, diastolic):
-    for category, thresholds in BP_CATEGORIES.items():
-        if thresholds['min_systolic'] <= systolic <= thresholds['max_systolic'] and thresholds['min_diastolic'] <= diastolic <= thresholds['max_diastolic']:
-            return category
-    return 'Unknown'
-
-# Create a bar chart for blood pressure categories
-def create_bp_bar_chart(data, title):
-    # Filter the data based on the selected patient
-    BP_categories = data.copy()  # Make a copy to avoid the SettingWithCopyWarning
-
-    # Categorize blood pressure readings
-    BP_categories['BP_Category'] = BP_categories.apply(
-        lambda row: categorize_blood_pressure(row['Systolic_Pressure'], row['Diastolic_Pressure']), axis=1)
-
-    # Count the occurrences of each category
-    category_counts = BP_categories['BP_Category'].value_counts().reset_index()
-    category_counts.columns = ['Categoria', 'Número de Medições']
+# Create a bar chart for blood pressure categories from the store's category counts
+def create_bp_bar_chart(category_counts, title):
+    rules = get_store().category_rules
+    category_counts = category_counts.rename(columns={'Category': 'Categoria', 'Count': 'Número de Medições'})
 
     bar_chart = alt.Chart(category_counts).mark_bar().encode(
-        x=alt.X('Categoria', sort=['Baixa', 'Normal', 'Alta']),
+        x=alt.X('Categoria', sort=rules.categories),
         y='Número de Medições',
-        color=alt.Color('Categoria', scale=alt.Scale(domain=['Baixa', 'Normal', 'Alta'], range=[COLOR_SCHEME['Baixa'], COLOR_SCHEME['Normal'], COLOR_SCHEME['Alta']])),
+        color=alt.Color('Categoria', scale=alt.Scale(domain=rules.categories, range=[rules.colors[category] for category in rules.categories])),
     ).properties(
         title=title
     )
     return bar_chart
 
-def create_bp_history_chart(data, title, period):
-    # Convert Date_of_Measurement to datetime if not already
-    if data['Date_of_Measurement'].dtype == 'object':
-        data['Date_of_Measurement'] = pd.to_datetime(data['Date_of_Measurement'])
+# Scatter of systolic and diastolic pressure. Each series is reduced to at most
+# max_points points (about one per pixel) with LTTB before it is sent to the
+# browser. Returns the chart and the number of points drawn.
+def create_bp_history_chart(data, title, period, max_points=CHART_WIDTH):
+    systolic = downsample(data, 'Date_of_Measurement', 'Systolic_Pressure', max_points)
+    diastolic = downsample(data, 'Date_of_Measurement', 'Diastolic_Pressure', max_points)
 
     # Create a line chart for systolic and diastolic pressure
-    chart = alt.Chart(data).mark_circle(color='red').encode(
+    chart = alt.Chart(systolic).mark_circle(color='red').encode(
         x=alt.X('Date_of_Measurement:T', title='Time'),
         y=alt.Y('Systolic_Pressure:Q', title='Systolic Pressure', scale=alt.Scale(domain=[data['Systolic_Pressure'].min() - 10, data['Systolic_Pressure'].max() + 10])),
         tooltip=['Date_of_Measurement:T', 'Systolic_Pressure:Q']
     ).properties(
         title=title
-    ) + alt.Chart(data).mark_circle(color='blue').encode(
+    ) + alt.Chart(diastolic).mark_circle(color='blue').encode(
         x=alt.X('Date_of_Measurement:T', title='Time'),
         y=alt.Y('Diastolic_Pressure:Q', title='Diastolic Pressure', scale=alt.Scale(domain=[data['Diastolic_Pressure'].min() - 10, data['Diastolic_Pressure'].max() + 10])),
         tooltip=['Date_of_Measurement:T', 'Diastolic_Pressure:Q']
@@ -213,19 +270,16 @@ def create_bp_history_chart(data, title, period):
             x=alt.X('Date_of_Measurement:T', axis=alt.Axis(format='%H:%M', title='Hora', tickCount=24))
         )
 
-    return chart
+    return chart, len(systolic) + len(diastolic)
 
-def create_measurements_chart(data, title, period):
-    # Convert Date_of_Measurement to datetime if not already
-    if data['Date_of_Measurement'].dtype == 'object':
-        data['Date_of_Measurement'] = pd.to_datetime(data['Date_of_Measurement'])
+# Bar chart of measurement counts from the store's per-hour counts: hourly for
+# the last day, daily otherwise, merged into weeks or months when the bars
+# would be narrower than MIN_BAR_PIXELS. Returns the chart and its number of bars.
+def create_measurements_chart(hourly_counts, title, period, width=CHART_WIDTH):
+    min_frequency = 'h' if period == 'Último dia' else 'D'
+    count_data, frequency = bin_counts(hourly_counts, 'Hour', max_bars=width // MIN_BAR_PIXELS, min_frequency=min_frequency)
 
-# Customize the chart based on the period
-    if period == 'Último dia':
-        # Group by hour for the last day
-        data['Hour'] = data['Date_of_Measurement'].dt.floor('H')
-        count_data = data.groupby('Hour').size().reset_index(name='Count')
-        
+    if frequency == 'h':
         # Create a bar chart for the number of measurements grouped by hour
         chart = alt.Chart(count_data).mark_bar(color='lightblue').encode(
             x=alt.X('Hour:T', axis=alt.Axis(format='%H:%M', title='Hora')),
@@ -234,11 +288,8 @@ def create_measurements_chart(data, title, period):
             title=title
         )
     else:
-        # Group by date for other periods
-        data['Date'] = data['Date_of_Measurement'].dt.date
-        count_data = data.groupby('Date').size().reset_index(name='Count')
-
         # Create a bar chart for the number of measurements grouped by date
+        count_data = count_data.rename(columns={'Hour': 'Date'})
         chart = alt.Chart(count_data).mark_bar(color='lightblue').encode(
             x=alt.X('Date:T', title='Data'),
             y=alt.Y('Count:Q', title='Número de Medições')
@@ -246,23 +297,31 @@ def create_measurements_chart(data, title, period):
             title=title
         )
     
-    return chart
+    return chart, len(count_data)
 
-def filter_data_by_period(data, period):
-    data = data.copy()  # Avoid SettingWithCopyWarning
-    data['Date_of_Measurement'] = pd.to_datetime(data['Date_of_Measurement'])  # Ensure datetime format
+# Draw a chart and report the data points sent to the browser (counted when
+# the data was reduced) and the time spent since started
+def show_chart(chart, started, points, total_points=None):
+    st.altair_chart(chart, use_container_width=True)
+    shown = f"{points} de {total_points}" if total_points is not None else f"{points}"
+    st.caption(f"{shown} pontos, {1000 * (perf_counter() - started):.0f} ms")
+
+# Start of the selected analysis period, None for the full history
+def period_start(period):
     now = datetime.now()
     if period == 'Último dia':
-        start_date = now - timedelta(days=1)
+        return now - timedelta(days=1)
     elif period == 'Última semana':
-        start_date = now - timedelta(weeks=1)
+        return now - timedelta(weeks=1)
     elif period == 'Último mês':
-        start_date = now - timedelta(days=30)
-    else:
-        start_date = data['Date_of_Measurement'].min()
-    return data[data['Date_of_Measurement'] >= start_date]
+        return now - timedelta(days=30)
+    return None
+
+# Measurements of the selected period, as a slice of data sorted by date
+def filter_data_by_period(data, period):
+    return since(data, 'Date_of_Measurement', period_start(period))
 
-def measurement_screen(data):
+def measurement_screen(store):
 
     with st.container():
         col1, col2, col3 = st.columns(spec=[0.325, 0.35, 0.325])
@@ -301,16 +360,23 @@ def measurement_screen(data):
             # Button to generate a new measurement 
             if st.button("Nova Medição"):
                 if patient_name:
-                    data = load_data("data.csv")  # Reload data to ensure we're appending to the latest version
-                    new_measurement = get_new_measurement(patient_name, data)
-                    # Append the new measurement to the dataframe
-                    data = data._append(new_measurement, ignore_index=True)
-                    # Save the updated dataframe to the CSV file
-                    data.to_csv("data.csv", index=False)
-                    with col2:
-                        st.success("Medição realizada!")
-                        sleep(1.5)
-                        st.rerun()  # Reload the file to update the dataframe
+                    new_measurement = get_new_measurement(patient_name, store)
+                    if new_measurement is None:
+                        with col2:
+                            skipped = get_new_measure_pipeline(selected_model()).last_skipped
+                            if any(kind == 'quality' for timestamp, kind, reason in skipped):
+                                st.error("Sinal de baixa qualidade, repita a medição")
+                            elif skipped:
+                                st.error(f"Erro ao processar a medição: {skipped[0][2]}")
+                            else:
+                                st.error("Nenhum dado recebido do dispositivo")
+                    else:
+                        # Append the new measurement to the store
+                        write_measurement(new_measurement)
+                        with col2:
+                            st.success("Medição realizada!")
+                            sleep(1.5)
+                            st.rerun()  # Rerun to show the new measurement
                 else:
                     with col2:
                         st.error("Insira o nome do(a) paciente")
@@ -321,29 +387,22 @@ def measurement_screen(data):
     st.empty()
     st.subheader("Medições Pendentes:")
 
+    journal = get_journal()
+
     # Button to get requested measurements 
     if st.button("Procurar Novas Medições"):
-        # Load existing measurements
-        before_measures = load_data("requested_measures.csv")
-        before_count = len(before_measures)
-        
-        # Request new measurements via BLE
-        ble_request_measures()
-
-        # Load measurements after BLE request
-        after_measures = load_data("requested_measures.csv")
-        after_count = len(after_measures)
-
-        # Compare the number of rows before and after the BLE request
-        if after_count > before_count:
-            st.success("Novas medições foram adicionadas.")
+        # Request new measurements via BLE; measures already taken in are
+        # dropped by the pipeline, so every result is a new one
+        new_measures = ble_request_measures()
+
+        if new_measures:
+            st.success(f"{len(new_measures)} novas medições foram adicionadas.")
             st.rerun()
         else:
             st.error("Nenhuma nova medição para ler.")
 
     # Load pending measures
-    pending_measures_df = load_data("requested_measures.csv")
-    pending_measures_df['Name'] = pending_measures_df['Name'].astype(str).replace('nan', '')
+    pending_measures_df = journal.pending()
 
     #----------------------------------------------------------------------------------------------
     col1, col2 = st.columns(spec=[0.5, 0.5])
@@ -359,9 +418,8 @@ def measurement_screen(data):
             key="1",
         )
 
-        # Separate rows with names entered from the ones without names
-        named_measures_df = edited_pending_measures_df[edited_pending_measures_df['Name'].str.strip() != '']
-        unnamed_measures_df = edited_pending_measures_df[edited_pending_measures_df['Name'].str.strip() == '']
+        # Rows with a name entered are ready to be recorded
+        named_measures_df = edited_pending_measures_df[edited_pending_measures_df['Name'].fillna('').str.strip() != '']
 
     with col2:
         # Display the processed measures
@@ -377,25 +435,22 @@ def measurement_screen(data):
         # Button to get requested measurements 
         if st.button("Apontar Medições"):
             placeholder = st.empty()
-            # Save the unnamed measures back to the pending measures CSV
-            save_data(unnamed_measures_df, "requested_measures.csv")
-
-            # Append the new named measurements to the processed measures CSV
+            # Unnamed measures simply stay pending in the journal; the named
+            # ones are journaled with their edits and moved to the store
             if not named_measures_df.empty:
-                processed_measures_df = load_data("processed_measures.csv")
-                processed_measures_df['Name'] = processed_measures_df['Name'].astype(str)
-
-                processed_measures_df = processed_measures_df._append(named_measures_df, ignore_index=True)
-                save_data(processed_measures_df, "processed_measures.csv")
-                append_measurements()
-                st.rerun()
+                named = journal.name(named_measures_df)
+                append_measurements(journal, store)
+                if named < len(named_measures_df):
+                    placeholder.warning("Medições sem pressão sistólica ou diastólica continuam pendentes")
+                else:
+                    st.rerun()
             else:
                 placeholder.error("Nenhuma nova medição foi apontada", icon=":material/cancel:")
 
 
     #----------------------------------------------------------------------------------------------
 
-def general_screen(data):
+def general_screen(store):
     
     with st.container():
         col1, col2, col3 = st.columns(spec=[0.225, 0.55, 0.225])
@@ -412,11 +467,14 @@ def general_screen(data):
     
     col1, col2 = st.columns(spec=[0.6,0.4])
 
+    version = store.version()
+    hourly_counts = load_hourly_counts(version)
+
     with col1:
-        data = load_data("data.csv")  # Reload data to ensure we're appending to the latest version
-        data_general = data.drop(columns=['Id']).reset_index(drop=True)
+        # Only the most recent rows are sent to the table, so the page does not grow with the history
+        data_general = load_recent_measurements(version).drop(columns=['Id']).reset_index(drop=True)
 
-        st.write("Dados dos pacientes:")
+        st.write(f"Dados dos pacientes (últimas {len(data_general)} de {hourly_counts['Count'].sum()} medições):")
 
         st.data_editor(
             data_general,
@@ -426,14 +484,18 @@ def general_screen(data):
 
     with col2:
         period = st.selectbox("Selecione o Período de análise", ["Histórico completo", "Último mês", "Última semana", "Último dia"])
-        filtered_period_data = filter_data_by_period(data_general, period)
-        st.altair_chart(create_measurements_chart(filtered_period_data, f"Histórico de medidas: {period}", period), use_container_width=True)
+        started = perf_counter()
+        start_date = period_start(period)
+        if start_date is not None:
+            hourly_counts = since(hourly_counts, 'Hour', pd.Timestamp(start_date).floor('h'))
+        chart, points = create_measurements_chart(hourly_counts, f"Histórico de medidas: {period}", period)
+        show_chart(chart, started, points)
 
     st.subheader("Medições de pressão categorizadas")
 
-    st.altair_chart(create_bp_bar_chart(data_general, "Gráfico de medições categorizadas"), use_container_width=True)
+    st.altair_chart(create_bp_bar_chart(load_category_counts(version), "Gráfico de medições categorizadas"), use_container_width=True)
 
-def patient_screen(data):
+def patient_screen(store):
     
     with st.container():
         col1, col2, col3 = st.columns(spec=[0.21, 0.58, 0.21])
@@ -448,12 +510,10 @@ def patient_screen(data):
         with col3:
             st.empty()
     
-    data = load_data("data.csv")  # Reload data to ensure we're appending to the latest version
-    data_patients = data.drop(columns=['Id']).reset_index(drop=True)
-    
-    data_patients = sorted(data['Name'].unique().tolist())
+    patient_ids = store.patients.ids_by_name()
+    data_patients = sorted(patient_ids)
     selected_patient = st.selectbox("Selecione o Paciente", data_patients)
-    filtered_data = data[data['Name'] == selected_patient]
+    filtered_data = load_patient_measurements(store.version(), patient_ids.get(selected_patient, -1))
 
     col1, col2 = st.columns(2)
 
@@ -467,26 +527,64 @@ def patient_screen(data):
             hide_index=True,
         )
     with col2:
-        st.altair_chart(create_bp_bar_chart(data[data['Name'] == selected_patient], f"Medições de pressão categorizadas; {selected_patient}"), use_container_width=True)
+        st.altair_chart(create_bp_bar_chart(load_category_counts(store.version(), patient_ids.get(selected_patient, -1)), f"Medições de pressão categorizadas; {selected_patient}"), use_container_width=True)
 
     period = st.selectbox("Selecione o Período", ["Histórico completo", "Último mês", "Última semana", "Último dia"])
+    started = perf_counter()
     filtered_period_data = filter_data_by_period(filtered_data, period)
-    st.altair_chart(create_bp_history_chart(filtered_period_data, f"Medições de pressão: {selected_patient} ({period})", period), use_container_width=True)
+
+    # Long histories are downsampled; narrowing the interval brings back full resolution
+    if len(filtered_period_data) > CHART_WIDTH:
+        dates = filtered_period_data['Date_of_Measurement']
+        first, last = dates.iloc[0].to_pydatetime(), dates.iloc[-1].to_pydatetime()
+        interval = st.slider("Intervalo exibido", min_value=first, max_value=last, value=(first, last), format="DD/MM/YYYY HH:mm")
+        filtered_period_data = between(filtered_period_data, 'Date_of_Measurement', *interval)
+
+    chart, points = create_bp_history_chart(filtered_period_data, f"Medições de pressão: {selected_patient} ({period})", period)
+    show_chart(chart, started, points, 2 * len(filtered_period_data))
 
 def main():
-    # Load data from CSV
-    csv_file = "data.csv"  # Update with your CSV file path
-    data = st.cache_data(load_data)(csv_file)
+    # Open the measurement store
+    store = get_store()
 
     # Add a sidebar menu for selecting the table to display
     menu_selection = st.sidebar.selectbox("Menu", ("Medições","Informações Gerais", "Informações Individuais"))
 
+    # Show the state of the shared BLE connection
+    if get_ble_session().is_connected:
+        st.sidebar.success("Dispositivo conectado", icon=":material/check:")
+    else:
+        st.sidebar.warning("Dispositivo desconectado, reconectando...")
+
+    # Model used for new and requested measures
+    models = model_names()
+    st.sidebar.selectbox("Modelo", models, index=models.index(active_model()), key='model')
+
+    # Report cold-start and warm-path inference latency, and compare the models
+    # on the samples of the last new measure
+    with st.sidebar.expander("Desempenho do modelo"):
+        st.json(get_predictor(selected_model()).latency_report())
+        st.write("Cache de predições")
+        st.json(get_prediction_cache().stats())
+        st.write("Índice de medições recebidas")
+        st.json(get_ingest_index().stats())
+        last_samples = get_new_measure_pipeline(selected_model()).last_samples
+        if last_samples is None:
+            st.caption("Faça uma nova medição para comparar os modelos.")
+        elif st.button("Comparar modelos"):
+            report = compare_models([last_samples], models)
+            st.dataframe(pd.DataFrame([
+                {'Modelo': name, 'Sistólica': result['systolic_mean'], 'Diastólica': result['diastolic_mean'],
+                 'ms/medição': result['ms_per_record'], 'Carga (s)': result['load_seconds']}
+                for name, result in report.items()
+            ]), hide_index=True)
+
     if menu_selection == "Medições":
-        measurement_screen(data)
+        measurement_screen(store)
     elif menu_selection == "Informações Gerais":
-        general_screen(data)
+        general_screen(store)
     elif menu_selection == "Informações Individuais":
-        patient_screen(data)
+        patient_screen(store)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
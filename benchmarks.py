@@ -0,0 +1,692 @@
+import sys
+import time
+import numpy as np
+from synthetic_data_generator import synthetic_ppg
+
+# The original per-signal preprocessing, kept as the reference for benchmarks
+def legacy_preprocess_signal(values):
+    from scipy.signal import cheby2, filtfilt
+    from scipy.interpolate import interp1d
+
+    ppg_signal = np.array(values) * -1
+    fs = len(ppg_signal) / 10
+    nyquist = 0.5 * fs
+    b, a = cheby2(4, 40, [0.5 / nyquist, 8.0 / nyquist], btype='bandpass')
+    filtered_signal = filtfilt(b, a, ppg_signal)
+    x = np.linspace(0, 1, num=len(filtered_signal))
+    x_new = np.linspace(0, 1, num=1250)
+    interpolated_signal = interp1d(x, filtered_signal, kind='cubic')(x_new)
+    scaled_signal = (interpolated_signal - np.min(interpolated_signal)) / (np.max(interpolated_signal) - np.min(interpolated_signal))
+    return np.array(scaled_signal, dtype=np.float32)
+
+# The original regex + eval path of ble_request_measures and bp_request_predicts
+def legacy_parse_requested_measures(data_chunks):
+    import re
+    from datetime import datetime
+
+    full_data = ''.join(data_chunks)
+    pattern = re.compile(r"\(([^)]+)\)")
+    records = []
+    for match in pattern.findall(full_data):
+        timestamp, values = match.split(", [")
+        values = values.rstrip("]")
+        line = f"({timestamp}, [{values}])".strip().strip('()')
+        timestamp_str, values_str = line.split(', ', 1)
+        records.append((datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S'), eval(values_str)))
+    return records
+
+# A device backlog as the BLE notification chunks that carry it
+def synthetic_backlog_chunks(num_records, chunk_size=244):
+    from datetime import datetime, timedelta
+    from ppg_parser import format_measurement
+
+    start = datetime(2024, 6, 17, 15, 4, 37)
+    signals = synthetic_ppg(num_records)
+    payload = ''.join(format_measurement(start + timedelta(minutes=30 * i), signal) for i, signal in enumerate(signals))
+    return [payload[i:i + chunk_size].encode() for i in range(0, len(payload), chunk_size)]
+
+# Cold start versus warm path of the in-process predictor
+def bench_predictor(repeats=20):
+    from bp_predictor import BPPredictor
+
+    signal = synthetic_ppg(1)[0]
+    predictor = BPPredictor()
+    predictor.load()
+    for _ in range(repeats + 1):
+        predictor.predict(signal)
+
+    for key, value in predictor.latency_report().items():
+        print(f"{key}: {value}")
+
+# Load + warm-up time, latency per batch size and MAE against the reference
+# SavedModel for every inference backend, on CPU
+def bench_backends(num_signals=512, batch_sizes=(1, 16, 64, 256), backends=None):
+    from bp_predictor import BPPredictor
+    from inference_backends import BACKENDS, DEFAULT_BACKEND
+    from preprocessing import preprocess_signals
+
+    scaled_signals = preprocess_signals(synthetic_ppg(num_signals))
+    reference = None
+    for name in [DEFAULT_BACKEND] + [name for name in (backends or BACKENDS) if name != DEFAULT_BACKEND]:
+        predictor = BPPredictor(backend=name, warmup_batch_sizes=batch_sizes).load()
+        latencies = []
+        for batch_size in batch_sizes:
+            start_time = time.perf_counter()
+            predictions = predictor.predict_batch(scaled_signals, batch_size=batch_size)
+            latencies.append(f"B={batch_size} {1000 * (time.perf_counter() - start_time) / num_signals:.2f}")
+        if reference is None:
+            reference = predictions
+        systolic_mae, diastolic_mae = np.abs(predictions - reference).mean(axis=0)
+        print(f"{name}: load {predictor.load_seconds:.2f} s, warm-up {predictor.warmup_seconds:.2f} s, "
+              f"ms/record {', '.join(latencies)}, MAE vs {DEFAULT_BACKEND} systolic {systolic_mae:.3f} / diastolic {diastolic_mae:.3f} mmHg")
+
+# Process startup per backend: a fresh interpreter imports the backend, loads
+# the model and predicts one reading; reports wall time and peak resident memory
+def bench_startup(backends=('savedmodel', 'tflite-float16', 'onnx'), model_name=None):
+    import subprocess
+
+    script = (
+        "import resource, time; start = time.perf_counter()\n"
+        "from model_registry import get_model_predictor\n"
+        "from synthetic_data_generator import synthetic_ppg\n"
+        f"predictor = get_model_predictor({model_name!r}, backend=BACKEND)\n"
+        "predictor.predict(synthetic_ppg(1)[0])\n"
+        "print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    )
+    for backend in backends:
+        completed = subprocess.run([sys.executable, '-c', f"BACKEND = {backend!r}\n" + script],
+                                   capture_output=True, text=True)
+        if completed.returncode:
+            print(f"{backend}: failed, {completed.stderr.strip().splitlines()[-1]}")
+            continue
+        seconds, max_rss = completed.stdout.split()[-2:]
+        print(f"{backend}: first prediction after {float(seconds):.2f} s, peak RSS {int(max_rss) / 1024:.0f} MB")
+
+# Every registered model over the same signals: load time, latency and how far
+# their predictions are apart
+def bench_models(num_signals=512, backend=None):
+    from model_registry import compare_models
+
+    signals = synthetic_ppg(num_signals)
+    for name, result in compare_models(signals, backend=backend).items():
+        print(f"{name}: " + ", ".join(f"{key} {value:.3f}" for key, value in result.items()
+                                      if isinstance(value, float)))
+
+# Per-record inference versus batched inference over a device backlog
+def bench_batched_requests(num_records=500, batch_sizes=(1, 16, 64, 256)):
+    from bp_predictor import BPPredictor, preprocess_signal
+
+    signals = synthetic_ppg(num_records)
+    scaled_signals = np.stack([preprocess_signal(signal) for signal in signals])
+    predictor = BPPredictor().load()
+    predictor.predict_batch(scaled_signals[:1])  # Warm-up
+
+    for batch_size in batch_sizes:
+        start_time = time.perf_counter()
+        predictor.predict_batch(scaled_signals, batch_size=batch_size)
+        elapsed = time.perf_counter() - start_time
+        print(f"batch_size={batch_size}: {elapsed:.3f} s, {num_records / elapsed:.1f} records/s")
+
+# Signals/second of the per-signal loop versus the vectorized preprocessing engine
+def bench_preprocessing(num_signals=1000):
+    from preprocessing import preprocess_batch
+
+    signals = synthetic_ppg(num_signals)
+
+    start_time = time.perf_counter()
+    reference = np.stack([legacy_preprocess_signal(signal) for signal in signals])
+    loop_seconds = time.perf_counter() - start_time
+
+    preprocess_batch(signals[:1])  # Fill the coefficient and resampling caches
+    start_time = time.perf_counter()
+    batched = preprocess_batch(signals)
+    batch_seconds = time.perf_counter() - start_time
+
+    print(f"per-signal loop: {num_signals / loop_seconds:.1f} signals/s")
+    print(f"vectorized batch: {num_signals / batch_seconds:.1f} signals/s ({loop_seconds / batch_seconds:.1f}x)")
+    print(f"max abs difference: {np.max(np.abs(reference - batched)):.2e}")
+
+# Parsing time and peak memory: regex + eval versus the streaming parser
+def bench_parser(num_records=500):
+    import tracemalloc
+    from ppg_parser import MeasurementParser
+
+    chunks = synthetic_backlog_chunks(num_records)
+
+    def legacy():
+        return legacy_parse_requested_measures([chunk.decode() for chunk in chunks])
+
+    def streaming():
+        parser = MeasurementParser()
+        measurements = []
+        for chunk in chunks:
+            measurements.extend(parser.feed(chunk))
+        return measurements
+
+    for label, parse in (('regex + eval', legacy), ('streaming parser', streaming)):
+        start_time = time.perf_counter()
+        records = parse()
+        elapsed = time.perf_counter() - start_time
+        tracemalloc.start()
+        parse()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{label}: {len(records)} records in {elapsed:.3f} s, peak {peak / 1e6:.1f} MB")
+
+# Aggregate records/s of the hub against simulated devices (no radio needed)
+def bench_hub(device_counts=(1, 2, 4, 8, 12), records_per_device=5, max_concurrency=4):
+    import asyncio
+    from ble_hub import BleHub
+    from ble_device import SERVICE_UUID, TX_CHARACTERISTIC_UUID, RX_CHARACTERISTIC_UUID
+    from ble_simulator import SimulatedPeripheral, simulated_client_factory
+
+    for num_devices in device_counts:
+        peripherals = {}
+        devices = []
+        for i in range(num_devices):
+            address = f"SIM:{i:02d}"
+            # ~7.5 ms connection interval per 244 byte notification, 0.3 s to connect
+            peripherals[address] = SimulatedPeripheral(address, num_stored=records_per_device, chunk_interval=0.0075,
+                                                       connect_delay=0.3, seed=i)
+            devices.append({'id': f"sim-{i:02d}", 'address': address, 'service_uuid': SERVICE_UUID,
+                            'tx_char_uuid': TX_CHARACTERISTIC_UUID, 'rx_char_uuid': RX_CHARACTERISTIC_UUID})
+        hub = BleHub(devices, max_concurrency=max_concurrency, client_factory=simulated_client_factory(peripherals))
+
+        start_time = time.perf_counter()
+        records = asyncio.run(hub.request_all())
+        elapsed = time.perf_counter() - start_time
+        print(f"{num_devices} devices: {len(records)} records in {elapsed:.2f} s, {len(records) / elapsed:.1f} records/s")
+
+# Memory and time to first processed batch for a large device backlog:
+# collecting the whole transfer versus streaming it with a bounded window, and
+# streaming a fifth of it into a consumer slower than the device (consumer_delay
+# seconds per record; the simulator sends about one per ms), where the device
+# must be paused and resumed so that no more than window records wait in the
+# device queue
+def bench_streaming(num_records=5000, window=64, consumer_delay=0.005):
+    import tracemalloc
+    from ble_device import BleDevice, SERVICE_UUID, TX_CHARACTERISTIC_UUID, RX_CHARACTERISTIC_UUID
+    from ble_session import BleSessionManager
+    from ble_simulator import SimulatedPeripheral, simulated_client_factory
+    from preprocessing import preprocess_signals
+
+    peripheral = SimulatedPeripheral("SIM:00", num_stored=num_records, supports_binary=True)
+    stored = list(peripheral.stored)
+    device = BleDevice(peripheral.address, SERVICE_UUID, TX_CHARACTERISTIC_UUID, RX_CHARACTERISTIC_UUID,
+                       simulated_client_factory(peripheral), verbose=False)
+    session = BleSessionManager(device).start()
+
+    # The simulated device builds its whole payload up front (num_records * ~1.6 kB), which is in the peaks
+    runs = (("collect", session.request_measures, stored, 0.0),
+            ("stream", lambda: session.stream_measures(window=window), stored, 0.0),
+            ("stream, slow consumer", lambda: session.stream_measures(window=window),
+             stored[:num_records // 5], consumer_delay))
+    for label, acquire, backlog, delay in runs:
+        peripheral.stored = list(backlog)
+        peripheral.commands = []
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        first_batch = None
+        processed = 0
+        batch = []
+        for record in acquire():
+            if delay:
+                time.sleep(delay)
+            batch.append(record)
+            if len(batch) == window:
+                preprocess_signals([samples for timestamp, samples in batch])
+                processed += len(batch)
+                batch = []
+                first_batch = first_batch or time.perf_counter() - start_time
+        preprocess_signals([samples for timestamp, samples in batch])
+        processed += len(batch)
+        elapsed = time.perf_counter() - start_time
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{label}: {processed} records in {elapsed:.2f} s, first batch after {first_batch:.2f} s, "
+              f"peak {peak / 1e6:.1f} MB, {peripheral.commands.count('pause')} pauses, "
+              f"{peripheral.commands.count('resume')} resumes, peak queue depth {device.peak_pending}")
+        if label != "collect":
+            assert device.peak_pending <= window, f"{device.peak_pending} records queued with a window of {window}"
+    session.stop()
+
+# A backlog where a share of the recordings is flat, saturated or noise only:
+# cost of the quality checks per record against the preprocessing and model
+# calls they save, and how many recordings of each kind are rejected
+def bench_quality(num_records=2000, bad_share=0.25, predictor=None):
+    from model_registry import get_model_predictor
+    from preprocessing import preprocess_signals
+    from signal_quality import assess_signals
+
+    rng = np.random.default_rng(2)
+    signals = list(synthetic_ppg(num_records))
+    kinds = rng.choice(['good', 'flat', 'clipped', 'noise'], size=num_records,
+                       p=[1 - bad_share, bad_share / 3, bad_share / 3, bad_share / 3])
+    for i, kind in enumerate(kinds):
+        if kind == 'flat':
+            signals[i] = np.full_like(signals[i], signals[i][0])
+        elif kind == 'clipped':
+            signals[i] = np.minimum(signals[i], np.percentile(signals[i], 80).astype(np.int64))
+        elif kind == 'noise':
+            signals[i] = rng.normal(28690, 40, len(signals[i])).astype(np.int64)
+
+    start_time = time.perf_counter()
+    quality = assess_signals(signals)
+    quality_seconds = time.perf_counter() - start_time
+    for kind in ('good', 'flat', 'clipped', 'noise'):
+        print(f"{kind}: {(~quality['accepted'][kinds == kind]).sum()} of {(kinds == kind).sum()} rejected")
+
+    predictor = predictor or get_model_predictor()
+    start_time = time.perf_counter()
+    predictor.predict_batch(preprocess_signals(signals))
+    all_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    predictor.predict_batch(preprocess_signals([signal for signal, accepted in zip(signals, quality['accepted']) if accepted]))
+    accepted_seconds = time.perf_counter() - start_time
+    print(f"quality checks {1e3 * quality_seconds / num_records:.3f} ms/record; preprocessing and inference "
+          f"{all_seconds:.2f} s for every record, {quality_seconds + accepted_seconds:.2f} s with the gate")
+
+# Per signal and per batch: the original preprocessing (filter design and
+# spline construction on every call), cubic resampling with cached
+# coefficients and polyphase resampling from the device rate, for the
+# recording lengths of devices sampling at different rates
+def bench_resampling(num_signals=200, rates=(81, 100, 250)):
+    from preprocessing import WINDOW_SECONDS, preprocess_batch
+
+    for fs in rates:
+        signals = synthetic_ppg(num_signals, num_values=int(fs * WINDOW_SECONDS))
+        reference = np.stack([legacy_preprocess_signal(signal) for signal in signals[:20]])
+        start_time = time.perf_counter()
+        for signal in signals[:20]:
+            legacy_preprocess_signal(signal)
+        timings = [f"original {1e3 * (time.perf_counter() - start_time) / 20:.2f}"]
+        for resampler in ('cubic', 'polyphase'):
+            preprocess_batch(signals[:1], fs=fs, resampler=resampler)  # Fill the caches
+            start_time = time.perf_counter()
+            for signal in signals:
+                preprocess_batch([signal], fs=fs, resampler=resampler)
+            single = 1e3 * (time.perf_counter() - start_time) / num_signals
+            start_time = time.perf_counter()
+            scaled_signals = preprocess_batch(signals, fs=fs, resampler=resampler)
+            batched = 1e3 * (time.perf_counter() - start_time) / num_signals
+            difference = np.abs(scaled_signals[:20] - reference).max()
+            timings.append(f"{resampler} {single:.2f} (batched {batched:.3f}, max diff {difference:.3f})")
+        print(f"{fs} Hz: ms/signal " + ", ".join(timings))
+
+# A device backlog sent twice, the second time with new records appended
+# (overlap of the history re-sent): pipeline time per transfer without and
+# with the prediction cache
+def bench_prediction_cache(num_records=2000, overlap=0.75, predictor=None):
+    import os
+    import tempfile
+    from datetime import datetime, timedelta
+    from model_registry import get_model_predictor
+    from pipeline import MeasurementPipeline
+    from prediction_cache import PredictionCache
+
+    predictor = predictor or get_model_predictor()
+    start = datetime(2024, 6, 17, 15, 4, 37)
+    records = [(start + timedelta(minutes=30 * i), signal)
+               for i, signal in enumerate(synthetic_ppg(int(num_records * (2 - overlap))))]
+    transfers = [records[:num_records], records[-num_records:]]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, cache in (("no cache", None), ("cache", PredictionCache(os.path.join(directory, "predictions.db")))):
+            pipeline = MeasurementPipeline(predictor, cache=cache)
+            timings = []
+            for transfer in transfers:
+                start_time = time.perf_counter()
+                list(pipeline.run_stream(transfer))
+                timings.append(f"{time.perf_counter() - start_time:.2f} s")
+            print(f"{label}: transfers {', '.join(timings)}" + (f", {cache.stats()}" if cache else ""))
+            if cache:
+                start_time = time.perf_counter()
+                keys = [cache.key(predictor.model_id, samples) for timestamp, samples in transfers[1]]
+                print(f"hashing {1e6 * (time.perf_counter() - start_time) / num_records:.1f} us/record")
+                cache.close()
+
+# Ingest index over a history of num_records ids: Bloom filter size, check
+# time per record for new and already ingested ids, false positive rate, and
+# the pipeline time of a backlog re-sent with and without the index
+def bench_ingest_index(num_records=1_000_000, num_checks=100_000, backlog=2000, predictor=None):
+    import os
+    import tempfile
+    from datetime import datetime, timedelta
+    from ingest_index import IngestIndex
+    from model_registry import get_model_predictor
+    from pipeline import MeasurementPipeline
+
+    # Random 20 hex digit ids, shaped like measure_journal.record_id
+    digits = np.random.default_rng(0).bytes(10 * (num_records + num_checks)).hex()
+    ids = [digits[i:i + 20] for i in range(0, len(digits), 20)]
+    with tempfile.TemporaryDirectory() as directory:
+        index = IngestIndex(os.path.join(directory, "ingested.db"), capacity=num_records)
+        start_time = time.perf_counter()
+        for start in range(0, num_records, 10000):
+            index.add(ids[start:start + 10000])
+        print(f"{num_records} ids: added in {time.perf_counter() - start_time:.1f} s, "
+              f"Bloom filter {index.stats()['bloom_bytes'] / 2**20:.2f} MB")
+        for label, checked in (("new", ids[num_records:]), ("ingested", ids[:num_checks])):
+            start_time = time.perf_counter()
+            seen = index.seen(checked)
+            print(f"{label}: {1e6 * (time.perf_counter() - start_time) / num_checks:.2f} us/record, "
+                  f"{seen.mean():.1%} seen")
+        print(f"false positive rate {index.stats()['false_positives'] / num_checks:.2%}")
+        index.close()
+
+        predictor = predictor or get_model_predictor()
+        start = datetime(2024, 6, 17, 15, 4, 37)
+        records = [(start + timedelta(minutes=30 * i), signal) for i, signal in enumerate(synthetic_ppg(backlog))]
+        for label, index in (("no index", None), ("index", IngestIndex(os.path.join(directory, "backlog.db")))):
+            pipeline = MeasurementPipeline(predictor, ingest_index=index)
+            timings = []
+            for transfer in range(2):
+                start_time = time.perf_counter()
+                results = list(pipeline.run_stream(records))
+                timings.append(f"{time.perf_counter() - start_time:.2f} s ({len(results)} results)")
+            print(f"{label}: transfers {', '.join(timings)}")
+            if index:
+                index.close()
+
+# Sequential run_stream against run_parallel with thread and process pools,
+# over a multi-device backlog; prints the per-stage throughput of each run
+def bench_parallel(num_records=4000, worker_counts=(2, 4, 8), predictor=None):
+    import os
+    from datetime import datetime, timedelta
+    from model_registry import get_model_predictor
+    from pipeline import MeasurementPipeline
+
+    predictor = predictor or get_model_predictor()
+    start = datetime(2024, 6, 17, 15, 4, 37)
+    signals = synthetic_ppg(num_records)
+    records = [(f"sensor-{i % 8:02d}", start + timedelta(minutes=30 * i), signal) for i, signal in enumerate(signals)]
+    pipeline = MeasurementPipeline(predictor)
+    list(pipeline.run_parallel(records[:64], workers=1))  # Warm-up
+
+    start_time = time.perf_counter()
+    reference = [(result.systolic, result.diastolic) for result in pipeline.run_stream(records)]
+    elapsed = time.perf_counter() - start_time
+    print(f"sequential: {num_records / elapsed:.0f} records/s on {os.cpu_count()} cores")
+
+    for executor in ('thread', 'process'):
+        for workers in worker_counts:
+            start_time = time.perf_counter()
+            results = [(result.systolic, result.diastolic) for result in pipeline.run_parallel(records, workers=workers, executor=executor)]
+            elapsed = time.perf_counter() - start_time
+            stages = ", ".join(f"{stage} {times['records_per_second']}" for stage, times in pipeline.stage_times.report().items())
+            print(f"{executor} x{workers}: {num_records / elapsed:.0f} records/s, same order {results == reference}; records/s per stage: {stages}")
+
+# Bytes on the air and decode time per measurement: text payload versus binary frames
+def bench_framing(num_records=200, mtu=244, notification_interval=0.0075):
+    from datetime import datetime, timedelta
+    from ppg_parser import MeasurementParser, format_measurement
+    from ppg_frames import FrameDecoder, encode_frame
+
+    start = datetime(2024, 6, 17, 15, 4, 37)
+    signals = synthetic_ppg(num_records)
+    timestamps = [start + timedelta(minutes=30 * i) for i in range(num_records)]
+    payloads = {
+        'text': ''.join(format_measurement(t, signal) for t, signal in zip(timestamps, signals)).encode() + b'\x04',
+        'binary': b''.join(encode_frame(t, signal) for t, signal in zip(timestamps, signals)) + b'\x04',
+    }
+
+    for label, payload in payloads.items():
+        chunks = [payload[i:i + mtu] for i in range(0, len(payload), mtu)]
+        decoder = FrameDecoder() if label == 'binary' else MeasurementParser()
+        start_time = time.perf_counter()
+        measurements = []
+        for chunk in chunks:
+            measurements.extend(decoder.feed(chunk))
+        decode_seconds = time.perf_counter() - start_time
+        transfer_seconds = len(chunks) * notification_interval
+        print(f"{label}: {len(payload) / num_records:.0f} bytes/measurement, "
+              f"transfer {1000 * transfer_seconds / num_records:.1f} ms/measurement, "
+              f"decode {1e6 * decode_seconds / num_records:.0f} us/measurement ({len(measurements)} decoded)")
+
+# Synthetic measurement history in data.csv layout
+def synthetic_history(num_rows, num_patients=1000, seed=0):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(1, num_patients + 1, size=num_rows)
+    seconds = np.sort(rng.integers(0, 365 * 86400, size=num_rows))
+    diastolic = rng.integers(40, 121, size=num_rows)
+    return pd.DataFrame({
+        'Id': ids,
+        'Name': [f"Patient {i}" for i in ids],
+        'Date_of_Measurement': (pd.Timestamp('2024-01-01') + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+        'Systolic_Pressure': (diastolic + rng.integers(35, 66, size=num_rows)).astype(float),
+        'Diastolic_Pressure': diastolic.astype(float),
+    })
+
+# Append and query latency of the SQLite store, against rewriting data.csv
+def bench_store(sizes=(10_000, 1_000_000, 10_000_000), csv_max_rows=1_000_000, repeats=50):
+    import os
+    import tempfile
+    import pandas as pd
+    from measurement_store import MeasurementStore
+
+    measurement = {'Id': 1, 'Name': 'Patient 1', 'Date_of_Measurement': '2025-01-01 12:00:00',
+                   'Systolic_Pressure': 120.0, 'Diastolic_Pressure': 80.0}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            history = synthetic_history(size)
+            store = MeasurementStore(os.path.join(directory, f"store_{size}.db"))
+            for start in range(0, size, 1_000_000):
+                store.append(history.iloc[start:start + 1_000_000])
+
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                store.append(measurement)
+            append_ms = 1000 * (time.perf_counter() - start_time) / repeats
+
+            start_time = time.perf_counter()
+            for patient_id in range(1, repeats + 1):
+                store.query_patient(patient_id, '2024-06-01', '2024-07-01')
+            query_ms = 1000 * (time.perf_counter() - start_time) / repeats
+
+            start_time = time.perf_counter()
+            store.scan()
+            scan_s = time.perf_counter() - start_time
+            store.close()
+            print(f"{size} rows: append {append_ms:.2f} ms, patient range query {query_ms:.2f} ms, full scan {scan_s:.2f} s")
+
+            if size <= csv_max_rows:
+                csv_file = os.path.join(directory, f"data_{size}.csv")
+                history.to_csv(csv_file, index=False)
+                start_time = time.perf_counter()
+                data = pd.read_csv(csv_file)
+                data = pd.concat([data, pd.DataFrame([measurement])], ignore_index=True)
+                data.to_csv(csv_file, index=False)
+                print(f"{size} rows: data.csv read + rewrite append {1000 * (time.perf_counter() - start_time):.1f} ms")
+
+# The original per-row categorization that app.py ran through DataFrame.apply
+def legacy_categorize_blood_pressure(systolic, diastolic):
+    bp_categories = {'Baixa': {'min_systolic': 0, 'max_systolic': 100, 'min_diastolic': 0, 'max_diastolic': 90},
+                     'Normal': {'min_systolic': 90, 'max_systolic': 120, 'min_diastolic': 70, 'max_diastolic': 80},
+                     'Alta': {'min_systolic': 130, 'max_systolic': float('inf'), 'min_diastolic': 90, 'max_diastolic': float('inf')}}
+    for category, thresholds in bp_categories.items():
+        if thresholds['min_systolic'] <= systolic <= thresholds['max_systolic'] and thresholds['min_diastolic'] <= diastolic <= thresholds['max_diastolic']:
+            return category
+    return 'Unknown'
+
+# Row-wise apply against the vectorized rule table on a synthetic history
+def bench_categorization(num_rows=1_000_000):
+    from bp_categories import load_category_rules
+    from synthetic_data_generator import generate_measurements
+
+    data = generate_measurements(num_rows)
+    start_time = time.perf_counter()
+    legacy = data.apply(lambda row: legacy_categorize_blood_pressure(row['Systolic_Pressure'], row['Diastolic_Pressure']), axis=1)
+    apply_s = time.perf_counter() - start_time
+    print(f"apply: {apply_s:.2f} s, {legacy.memory_usage(deep=True) / 1e6:.1f} MB, "
+          f"{(legacy == 'Unknown').mean():.1%} Unknown")
+
+    for name in ('padrao', 'aha'):
+        rules = load_category_rules(name)
+        start_time = time.perf_counter()
+        categories = rules.categorize_frame(data)
+        vectorized_s = time.perf_counter() - start_time
+        print(f"{name}: {1000 * vectorized_s:.1f} ms ({apply_s / vectorized_s:.0f}x), "
+              f"{categories.memory_usage(deep=True) / 1e6:.1f} MB, {(categories == 'Unknown').mean():.1%} Unknown, "
+              f"{(categories.astype(str) == legacy).mean():.1%} as apply")
+
+# Chart payload for a continuously monitored patient, full versus downsampled
+def bench_downsampling(num_points=(10_000, 100_000, 500_000), width=800):
+    import pandas as pd
+    from downsampling import downsample
+
+    rng = np.random.default_rng(0)
+    for size in num_points:
+        diastolic = rng.normal(80, 8, size=size)
+        data = pd.DataFrame({
+            'Date_of_Measurement': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(size) * 60, unit='s'),
+            'Systolic_Pressure': diastolic + rng.normal(40, 5, size=size),
+            'Diastolic_Pressure': diastolic,
+        })
+        start_time = time.perf_counter()
+        full_payload = len(data.to_json(orient='records', date_format='iso'))
+        full_s = time.perf_counter() - start_time
+        print(f"{size} points: full {full_payload / 1e6:.1f} MB, serialized in {1000 * full_s:.0f} ms")
+
+        for method in ('lttb', 'minmax'):
+            start_time = time.perf_counter()
+            series = [downsample(data, 'Date_of_Measurement', column, width, method)
+                      for column in ('Systolic_Pressure', 'Diastolic_Pressure')]
+            payload = sum(len(points.to_json(orient='records', date_format='iso')) for points in series)
+            elapsed = time.perf_counter() - start_time
+            print(f"  {method}: {sum(len(points) for points in series)} points, {payload / 1e3:.0f} kB, "
+                  f"downsampled + serialized in {1000 * elapsed:.0f} ms")
+
+# The original period filter of app.py: copy, reparse and mask on every change
+def legacy_filter_data_by_period(data, start_date):
+    import pandas as pd
+
+    data = data.copy()
+    data['Date_of_Measurement'] = pd.to_datetime(data['Date_of_Measurement'])
+    return data[data['Date_of_Measurement'] >= start_date]
+
+# Period switch on a patient history: reparse + mask against a searchsorted slice
+def bench_period_filter(num_rows=1_000_000, repeats=20):
+    import pandas as pd
+    from time_window import sort_by_time, since
+
+    history = synthetic_history(num_rows)
+    end = pd.Timestamp(history['Date_of_Measurement'].iloc[-1])
+    starts = {'Último mês': end - pd.Timedelta(days=30), 'Última semana': end - pd.Timedelta(weeks=1),
+              'Último dia': end - pd.Timedelta(days=1)}
+
+    start_time = time.perf_counter()
+    data = sort_by_time(history, 'Date_of_Measurement')
+    print(f"parse + sort once at load: {1000 * (time.perf_counter() - start_time):.0f} ms")
+
+    for period, start_date in starts.items():
+        start_time = time.perf_counter()
+        legacy = legacy_filter_data_by_period(history, start_date)
+        legacy_ms = 1000 * (time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            window = since(data, 'Date_of_Measurement', start_date)
+        window_ms = 1000 * (time.perf_counter() - start_time) / repeats
+        assert len(window) == len(legacy)
+        print(f"{period} ({len(window)} rows): reparse + mask {legacy_ms:.0f} ms, searchsorted slice {window_ms:.3f} ms, "
+              f"shares memory: {np.shares_memory(window['Systolic_Pressure'].to_numpy(), data['Systolic_Pressure'].to_numpy())}")
+
+# Pending measures in the layout of the old requested_measures.csv
+def synthetic_pending(num_rows, seed=0):
+    import pandas as pd
+
+    history = synthetic_history(num_rows, seed=seed)
+    return pd.DataFrame({
+        'Name': '',
+        'Date_of_Measurement': history['Date_of_Measurement'],
+        'Systolic_Pressure': history['Systolic_Pressure'],
+        'Diastolic_Pressure': history['Diastolic_Pressure'],
+        'Device': 'sensor-01',
+    })
+
+# Recording results and naming measures: the old CSV rewrites against the journal
+def bench_journal(pending_sizes=(1_000, 100_000), batch_size=64, named=10):
+    import os
+    import tempfile
+    import pandas as pd
+    from measure_journal import MeasureJournal
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in pending_sizes:
+            pending = synthetic_pending(size)
+            requested_file = os.path.join(directory, f"requested_{size}.csv")
+            processed_file = os.path.join(directory, f"processed_{size}.csv")
+            pending.to_csv(requested_file, index=False)
+            pending.iloc[0:0].to_csv(processed_file, index=False)
+
+            # "Apontar Medições" with the CSV files: rewrite the pending file
+            # without the named rows, append them to the processed file, read it
+            # back for the store and truncate it
+            edited = pd.read_csv(requested_file)
+            edited['Name'] = edited['Name'].astype(str).replace('nan', '')
+            edited.loc[:named - 1, 'Name'] = 'Patient 1'
+            start_time = time.perf_counter()
+            edited[edited['Name'] == ''].to_csv(requested_file, index=False)
+            processed = pd.concat([pd.read_csv(processed_file), edited[edited['Name'] != '']], ignore_index=True)
+            processed.to_csv(processed_file, index=False)
+            pd.read_csv(processed_file)
+            processed.iloc[0:0].to_csv(processed_file, index=False)
+            csv_ms = 1000 * (time.perf_counter() - start_time)
+
+            journal = MeasureJournal(os.path.join(directory, f"measures_{size}.journal"))
+            start_time = time.perf_counter()
+            for start in range(0, size, 10_000):
+                journal.add_pending(pending.iloc[start:start + 10_000])
+            load_s = time.perf_counter() - start_time
+            rows = journal.pending().iloc[:named].assign(Name='Patient 1')
+            start_time = time.perf_counter()
+            journal.name(rows)
+            journal.mark_committed(rows['Record_Id'])
+            journal_ms = 1000 * (time.perf_counter() - start_time)
+            journal.close()
+            print(f"{size} pending: name {named} measures, CSV rewrites {csv_ms:.1f} ms, journal {journal_ms:.1f} ms "
+                  f"(journal filled in {load_s:.2f} s)")
+
+        # Pipeline results: one fsync per batch against one per record
+        rows = synthetic_pending(batch_size * 20, seed=1).to_dict('records')
+        for label, step in (("fsync per record", 1), (f"fsync per batch of {batch_size}", batch_size)):
+            journal = MeasureJournal(os.path.join(directory, f"records_{step}.journal"))
+            start_time = time.perf_counter()
+            for start in range(0, len(rows), step):
+                journal.add_pending(rows[start:start + step])
+            elapsed = time.perf_counter() - start_time
+            journal.close()
+            print(f"{label}: {1e6 * elapsed / len(rows):.0f} us/record")
+
+BENCHMARKS = {
+    'predictor': bench_predictor,
+    'batched_requests': bench_batched_requests,
+    'backends': bench_backends,
+    'models': bench_models,
+    'startup': bench_startup,
+    'preprocessing': bench_preprocessing,
+    'parser': bench_parser,
+    'hub': bench_hub,
+    'framing': bench_framing,
+    'store': bench_store,
+    'categorization': bench_categorization,
+    'downsampling': bench_downsampling,
+    'period_filter': bench_period_filter,
+    'streaming': bench_streaming,
+    'parallel': bench_parallel,
+    'quality': bench_quality,
+    'resampling': bench_resampling,
+    'prediction_cache': bench_prediction_cache,
+    'ingest_index': bench_ingest_index,
+    'journal': bench_journal,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name}")
+        start_time = time.perf_counter()
+        BENCHMARKS[name]()
+        print(f"({time.perf_counter() - start_time:.2f} s)")
@@ -0,0 +1,190 @@
+import asyncio
+from collections import deque
+from contextlib import aclosing
+from bleak import BleakClient
+from ppg_parser import MeasurementParser
+from ppg_frames import FrameDecoder, is_binary_transfer
+
+DEVICE_ADDRESS = "28:CD:C1:0F:8F:03"
+SERVICE_UUID = "6E400001-B5A3-F393-E0A9-E50E24DCCA9E"
+TX_CHARACTERISTIC_UUID = "6E400003-B5A3-F393-E0A9-E50E24DCCA9E"
+RX_CHARACTERISTIC_UUID = "6E400002-B5A3-F393-E0A9-E50E24DCCA9E"
+
+# The firmware ends every response with an ASCII EOT byte. Devices that do
+# not send it are still handled: the transfer then ends once the link has
+# been silent for the timeout.
+END_OF_TRANSFER = b"\x04"
+
+# Asks the firmware to send binary frames (see ppg_frames.py). Firmware that
+# does not know the command keeps sending text, and every transfer is
+# detected by its first bytes, so both kinds of device work.
+BINARY_FORMAT_COMMAND = "format binary"
+
+# Flow control for long transfers: while `window` parsed records are waiting
+# to be consumed the firmware is asked to stop notifying, and to go on once
+# half of them have been. Firmware without flow control ignores both commands.
+PAUSE_COMMAND = "pause"
+RESUME_COMMAND = "resume"
+STREAM_WINDOW = 64
+
+class BleDevice:
+    def __init__(self, address, service_uuid, tx_char_uuid, rx_char_uuid, client_factory=BleakClient, verbose=True, binary=True):
+        self.address = address
+        self.service_uuid = service_uuid
+        self.tx_char_uuid = tx_char_uuid
+        self.rx_char_uuid = rx_char_uuid
+        self.client_factory = client_factory
+        self.verbose = verbose
+        self.binary = binary
+        self.client = None
+        self.parser = MeasurementParser()
+        self.decoder = None
+        self.received_bytes = 0
+        self.pending = deque()
+        self.peak_pending = 0  # Most records queued at once during the last stream
+        self.window = None
+        self.paused = False
+        self.pause_task = None
+        self.records_ready = asyncio.Event()
+        self.transfer_complete = asyncio.Event()
+        self.last_activity = 0.0
+
+    # Chunks are parsed as they arrive, so the full payload is never held as text
+    def notification_handler(self, sender, data):
+        if self.verbose:
+            print(f"Received chunk: {len(data)} bytes")
+        self.last_activity = asyncio.get_event_loop().time()
+        if self.received_bytes == 0 and is_binary_transfer(data):
+            self.decoder = FrameDecoder()
+        self.received_bytes += len(data)
+
+        if self.decoder is not None:
+            # Binary payloads may contain 0x04, so only the decoder can spot the end
+            self._deliver(self.decoder.feed(data))
+            if self.decoder.finished:
+                self.transfer_complete.set()
+        else:
+            self._deliver(self.parser.feed(data))
+            if END_OF_TRANSFER in data:
+                self.transfer_complete.set()
+        if self.transfer_complete.is_set():
+            self.records_ready.set()
+
+    # Queue parsed records for stream() and pause the device when the window is full
+    def _deliver(self, records):
+        if not records:
+            return
+        self.pending.extend(records)
+        self.peak_pending = max(self.peak_pending, len(self.pending))
+        self.records_ready.set()
+        if self.window and not self.paused and len(self.pending) >= self.window:
+            self.paused = True
+            self.pause_task = asyncio.ensure_future(self.send_command(PAUSE_COMMAND))
+
+    @property
+    def is_connected(self):
+        return self.client is not None and self.client.is_connected
+
+    async def connect(self):
+        self.client = self.client_factory(self.address)
+        await self.client.connect()
+        connected = self.client.is_connected
+        if self.verbose:
+            print(f"Connected: {connected}")
+        if connected:
+            await self.client.start_notify(self.tx_char_uuid, self.notification_handler)
+            if self.binary:
+                await self.send_command(BINARY_FORMAT_COMMAND)
+
+    async def disconnect(self):
+        if self.client:
+            await self.client.stop_notify(self.tx_char_uuid)
+            await self.client.disconnect()
+            if self.verbose:
+                print("Disconnected")
+
+    async def send_command(self, command):
+        if self.client:
+            await self.client.write_gatt_char(self.rx_char_uuid, command.encode())
+            if self.verbose:
+                print(f"Command sent: {command}")
+
+    # Wait until a record is queued or the transfer has ended. False when no
+    # data has arrived for `timeout` seconds.
+    async def _wait_for_records(self, timeout):
+        loop = asyncio.get_event_loop()
+        while not self.pending and not self.transfer_complete.is_set():
+            remaining = self.last_activity + timeout - loop.time()
+            if remaining <= 0:
+                print(f"No data for {timeout} s, ending transfer")
+                return False
+            self.records_ready.clear()
+            try:
+                await asyncio.wait_for(self.records_ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+    # Send a command over an open connection and yield its measurements one at a
+    # time as they are parsed. With a window, at most about `window` records are
+    # held here: the device is paused while the consumer falls behind.
+    async def stream(self, command, timeout, window=None):
+        self.parser = MeasurementParser()
+        self.decoder = None
+        self.received_bytes = 0
+        self.pending = deque()
+        self.peak_pending = 0
+        self.window = window
+        self.paused = False
+        self.records_ready = asyncio.Event()
+        self.transfer_complete = asyncio.Event()
+        self.last_activity = asyncio.get_event_loop().time()
+        await self.send_command(command)
+
+        try:
+            while await self._wait_for_records(timeout):
+                while self.pending:
+                    yield self.pending.popleft()
+                    if self.paused and len(self.pending) <= self.window // 2 and not self.transfer_complete.is_set():
+                        await self.pause_task  # The device must see pause before resume
+                        self.paused = False
+                        self.last_activity = asyncio.get_event_loop().time()
+                        await self.send_command(RESUME_COMMAND)
+                if self.transfer_complete.is_set():
+                    break
+        except (GeneratorExit, asyncio.CancelledError):
+            # The rest of an abandoned transfer would be mixed into the reply to
+            # the next command; dropping the link makes the firmware discard it
+            if not self.transfer_complete.is_set() and self.is_connected:
+                await self.disconnect()
+            raise
+
+        errors = self.decoder.errors if self.decoder is not None else self.parser.errors
+        for timestamp, error in errors:
+            print(f"Error parsing measure {timestamp}: {error}")
+
+    # Send a command over an open connection and collect the measurements it returns
+    async def request(self, command, timeout):
+        return [measurement async for measurement in self.stream(command, timeout)]
+
+    # One-shot connect, request and disconnect
+    async def get_measurement(self, command, timeout):
+        await self.connect()
+        try:
+            return await self.request(command, timeout)
+        finally:
+            await self.disconnect()
+
+    # One-shot connect, stream and disconnect
+    async def stream_measurement(self, command, timeout, window=STREAM_WINDOW):
+        await self.connect()
+        try:
+            async with aclosing(self.stream(command, timeout, window)) as measurements:
+                async for measurement in measurements:
+                    yield measurement
+        finally:
+            if self.is_connected:
+                await self.disconnect()
+
+def default_device(client_factory=BleakClient):
+    return BleDevice(DEVICE_ADDRESS, SERVICE_UUID, TX_CHARACTERISTIC_UUID, RX_CHARACTERISTIC_UUID, client_factory)
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+from contextlib import aclosing
+from bleak import BleakClient
+from ble_device import BleDevice, SERVICE_UUID, TX_CHARACTERISTIC_UUID, RX_CHARACTERISTIC_UUID, STREAM_WINDOW
+from stream_bridge import iterate_in_thread
+
+DEVICES_FILE = "devices.json"
+MAX_CONCURRENCY = 4
+
+# Read the ward device list: [{"id": ..., "address": ...}, ...], with the
+# Nordic UART UUIDs used unless a device overrides them. A device may declare
+# its PPG sampling rate in Hz ("sampling_rate"); a top-level "sampling_rate"
+# applies to the devices that do not.
+def load_device_config(config_file=DEVICES_FILE):
+    with open(config_file, 'r') as file:
+        config = json.load(file)
+
+    devices = []
+    for entry in config['devices']:
+        devices.append({
+            'id': str(entry['id']),
+            'address': entry['address'],
+            'service_uuid': entry.get('service_uuid', SERVICE_UUID),
+            'tx_char_uuid': entry.get('tx_char_uuid', TX_CHARACTERISTIC_UUID),
+            'rx_char_uuid': entry.get('rx_char_uuid', RX_CHARACTERISTIC_UUID),
+            'sampling_rate': entry.get('sampling_rate', config.get('sampling_rate')),
+        })
+    return devices
+
+# Sampling rate per device id for MeasurementPipeline, with the top-level rate
+# under '' for the single device of the BLE session. Empty without a config file.
+def load_sampling_rates(config_file=DEVICES_FILE):
+    if not os.path.exists(config_file):
+        return {}
+    with open(config_file, 'r') as file:
+        default_rate = json.load(file).get('sampling_rate')
+    rates = {entry['id']: entry['sampling_rate'] for entry in load_device_config(config_file) if entry['sampling_rate']}
+    if default_rate:
+        rates[''] = default_rate
+    return rates
+
+# Acquisition hub for several BLE devices. Stored measures are requested from
+# every device concurrently, at most `max_concurrency` links at a time, and
+# each record is tagged with the id of the device that produced it. A device
+# whose address already has a BleSessionManager (`sessions`, by address) is
+# reached through the session's open connection, since a peripheral accepts
+# only one client.
+class BleHub:
+    def __init__(self, devices, max_concurrency=MAX_CONCURRENCY, client_factory=BleakClient, verbose=False, sessions=None):
+        self.max_concurrency = max_concurrency
+        self.device_ids = [entry['id'] for entry in devices]
+        self.devices = {}
+        self.sessions = {}
+        for entry in devices:
+            if sessions and entry['address'] in sessions:
+                self.sessions[entry['id']] = sessions[entry['address']]
+                continue
+            self.devices[entry['id']] = BleDevice(entry['address'], entry['service_uuid'], entry['tx_char_uuid'],
+                                                  entry['rx_char_uuid'], client_factory, verbose)
+        self.errors = {}
+
+    def _get_measurement(self, device_id, command, timeout):
+        if device_id in self.sessions:
+            return self.sessions[device_id].request_from_loop(command, timeout)
+        return self.devices[device_id].get_measurement(command, timeout)
+
+    def _stream_measurement(self, device_id, command, timeout, window):
+        if device_id in self.sessions:
+            return self.sessions[device_id].stream_from_loop(command, timeout, window)
+        return self.devices[device_id].stream_measurement(command, timeout, window)
+
+    async def _request(self, semaphore, device_id, command, timeout):
+        async with semaphore:
+            try:
+                measurements = await self._get_measurement(device_id, command, timeout)
+            except Exception as e:
+                # An unreachable device must not hold up the rest of the ward
+                self.errors[device_id] = str(e)
+                print(f"Error requesting measures from {device_id}: {e}")
+                return []
+        return [(device_id, timestamp, samples) for timestamp, samples in measurements]
+
+    # Returns (device_id, timestamp, samples) records from all devices
+    async def request_all(self, command="request_measures", timeout=10):
+        self.errors = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*(self._request(semaphore, device_id, command, timeout) for device_id in self.device_ids))
+        return [record for device_records in results for record in device_records]
+
+    def request_measures(self, timeout=10):
+        return asyncio.run(self.request_all("request_measures", timeout))
+
+    async def _stream(self, semaphore, device_id, command, timeout, window, records):
+        async with semaphore:
+            try:
+                async with aclosing(self._stream_measurement(device_id, command, timeout, window)) as measurements:
+                    async for timestamp, samples in measurements:
+                        await records.put((device_id, timestamp, samples))
+            except Exception as e:
+                self.errors[device_id] = str(e)
+                print(f"Error requesting measures from {device_id}: {e}")
+
+    # Yields (device_id, timestamp, samples) records from all devices as they
+    # arrive. The devices share one queue of `window` records, so a slow
+    # consumer pauses every device that is transferring.
+    async def stream_all(self, command="request_measures", timeout=10, window=STREAM_WINDOW):
+        self.errors = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        records = asyncio.Queue(maxsize=window)
+        tasks = [asyncio.ensure_future(self._stream(semaphore, device_id, command, timeout, window, records))
+                 for device_id in self.device_ids]
+        finished = asyncio.ensure_future(asyncio.gather(*tasks))
+        try:
+            while not (finished.done() and records.empty()):
+                getter = asyncio.ensure_future(records.get())
+                await asyncio.wait({getter, finished}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+        finally:
+            finished.cancel()
+
+    # Blocking iterator over stream_all, for callers outside an event loop
+    def stream_measures(self, timeout=10, window=STREAM_WINDOW):
+        return iterate_in_thread(self.stream_all("request_measures", timeout, window), window, name="ble-hub")
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+from contextlib import aclosing
+from ble_device import STREAM_WINDOW
+from stream_bridge import iterate_threadsafe
+
+# Background BLE session: one BleDevice connection kept open on a dedicated
+# asyncio loop thread, reconnected with exponential backoff when it drops.
+# Commands from any thread (e.g. Streamlit reruns) are queued on the loop and
+# run one at a time over the shared connection.
+class BleSessionManager:
+    def __init__(self, device, reconnect_delay=1.0, max_reconnect_delay=30.0, poll_interval=1.0, connect_timeout=15.0):
+        self.device = device
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.poll_interval = poll_interval
+        self.connect_timeout = connect_timeout
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name=f"ble-{device.address}", daemon=True)
+        self.command_lock = None
+        self.connect_lock = None
+        self.keepalive_task = None
+        self.running = False
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread.start()
+            asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        return self
+
+    async def _start(self):
+        self.command_lock = asyncio.Lock()
+        self.connect_lock = asyncio.Lock()
+        self.keepalive_task = asyncio.ensure_future(self._keep_connected())
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    async def _stop(self):
+        self.keepalive_task.cancel()
+        if self.device.is_connected:
+            await self.device.disconnect()
+
+    @property
+    def is_connected(self):
+        return self.device.is_connected
+
+    async def _connect_once(self):
+        async with self.connect_lock:
+            if not self.device.is_connected:
+                self.device.client = None  # Forget a dropped link before reconnecting
+                await self.device.connect()
+            return self.device.is_connected
+
+    # Keep the link up, backing off between failed attempts
+    async def _keep_connected(self):
+        delay = self.reconnect_delay
+        while self.running:
+            if not self.device.is_connected:
+                try:
+                    connected = await self._connect_once()
+                except Exception as e:
+                    print(f"Connection to {self.device.address} failed: {e}")
+                    connected = False
+                if not connected:
+                    print(f"Reconnecting to {self.device.address} in {delay:.1f} s")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+                delay = self.reconnect_delay
+            await asyncio.sleep(self.poll_interval)
+
+    async def _wait_connected(self):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.connect_timeout
+        while not self.device.is_connected:
+            try:
+                if await self._connect_once():
+                    return
+            except Exception as e:
+                print(f"Connection to {self.device.address} failed: {e}")
+            if loop.time() >= deadline:
+                raise ConnectionError(f"Could not connect to {self.device.address}")
+            await asyncio.sleep(min(self.reconnect_delay, max(deadline - loop.time(), 0)))
+
+    # Coroutine form, for callers already running on the session loop
+    async def request_async(self, command, timeout):
+        async with self.command_lock:
+            await self._wait_connected()
+            return await self.device.request(command, timeout)
+
+    # Blocking form, for callers on other threads
+    def request(self, command, timeout):
+        if not self.running:
+            raise RuntimeError("BLE session is not running")
+        future = asyncio.run_coroutine_threadsafe(self.request_async(command, timeout), self.loop)
+        # The transfer itself ends on end-of-transfer or inactivity, so no outer timeout
+        return future.result()
+
+    async def _stream_async(self, command, timeout, window):
+        async with self.command_lock:
+            await self._wait_connected()
+            async with aclosing(self.device.stream(command, timeout, window)) as measurements:
+                async for measurement in measurements:
+                    yield measurement
+
+    # Blocking iterator over the measurements of a command, yielded as they are
+    # parsed, with at most about 2 * window records buffered in between
+    def stream(self, command, timeout, window=STREAM_WINDOW):
+        if not self.running:
+            raise RuntimeError("BLE session is not running")
+        return iterate_threadsafe(self._stream_async(command, timeout, window), self.loop, window)
+
+    # Run a coroutine on the session loop and await it from another loop
+    async def _on_loop(self, coroutine):
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+    # Forms of request and stream for coroutines running on another event loop
+    # (e.g. BleHub), so a device held by the session is reached through its
+    # connection instead of a second client
+    async def request_from_loop(self, command, timeout):
+        if not self.running:
+            raise RuntimeError("BLE session is not running")
+        return await self._on_loop(self.request_async(command, timeout))
+
+    async def stream_from_loop(self, command, timeout, window=STREAM_WINDOW):
+        if not self.running:
+            raise RuntimeError("BLE session is not running")
+        measurements = self._stream_async(command, timeout, window)
+
+        async def next_measurement():
+            return await measurements.__anext__()
+
+        try:
+            while True:
+                try:
+                    measurement = await self._on_loop(next_measurement())
+                except StopAsyncIteration:
+                    return
+                yield measurement
+        finally:
+            await self._on_loop(measurements.aclose())
+
+    def new_measure(self, timeout=2.5):
+        return self.request("new_measure", timeout)
+
+    def request_measures(self, timeout=10):
+        return self.request("request_measures", timeout)
+
+    def stream_measures(self, timeout=10, window=STREAM_WINDOW):
+        return self.stream("request_measures", timeout, window)
@@ -0,0 +1,134 @@
+import asyncio
+import numpy as np
+from datetime import datetime, timedelta
+from ble_device import END_OF_TRANSFER, PAUSE_COMMAND, RESUME_COMMAND
+from ppg_parser import format_measurement
+from ppg_frames import encode_frame
+
+# Local stand-in for the PPG peripheral, answering the same UART commands as
+# the firmware so BLE code can be exercised and benchmarked without a radio
+class SimulatedPeripheral:
+    def __init__(self, address, num_stored=0, num_values=810, mtu=244, chunk_interval=0.0,
+                 connect_delay=0.0, fail_connects=0, supports_binary=False, flow_control=True, seed=0):
+        self.address = address
+        self.num_values = num_values
+        self.mtu = mtu
+        self.chunk_interval = chunk_interval
+        self.connect_delay = connect_delay
+        self.fail_connects = fail_connects  # Number of connection attempts to refuse
+        self.supports_binary = supports_binary
+        self.binary = False
+        self.flow_control = flow_control
+        self.paused = False
+        self.rng = np.random.default_rng(seed)
+        self.connected = False
+        self.connect_count = 0
+        self.commands = []
+        self.stored = []
+        start = datetime(2024, 6, 17, 15, 4, 37)
+        for i in range(num_stored):
+            self.stored.append((start + timedelta(minutes=30 * i), self.waveform()))
+
+    def waveform(self):
+        t = np.linspace(0, 10, self.num_values)
+        heart_rate = self.rng.uniform(0.9, 1.8)
+        signal = 28690 + 40 * np.sin(2 * np.pi * heart_rate * t) + self.rng.normal(0, 5, self.num_values)
+        return signal.astype(np.int64)
+
+    # Payload the firmware would send in reply to a command
+    def respond(self, command):
+        self.commands.append(command)
+        if command == "format binary":
+            # Older firmware ignores the request and keeps sending text
+            self.binary = self.supports_binary
+            return b''
+        if command in (PAUSE_COMMAND, RESUME_COMMAND):
+            self.paused = self.flow_control and command == PAUSE_COMMAND
+            return b''
+        if self.binary:
+            if command == "new_measure":
+                payload = encode_frame(None, self.waveform())
+            elif command == "request_measures":
+                payload = b''.join(encode_frame(timestamp, samples) for timestamp, samples in self.stored)
+                self.stored = []
+            else:
+                payload = b''
+            return payload + END_OF_TRANSFER
+        if command == "new_measure":
+            payload = str(self.waveform().tolist())
+        elif command == "request_measures":
+            payload = ''.join(format_measurement(timestamp, samples) for timestamp, samples in self.stored)
+            self.stored = []
+        else:
+            payload = ''
+        return payload.encode() + END_OF_TRANSFER
+
+    # Drop the link, as when the device walks out of range
+    def drop_connection(self):
+        self.connected = False
+        self.binary = False
+        self.paused = False
+
+# Drop-in replacement for bleak.BleakClient that talks to a SimulatedPeripheral
+class SimulatedBleakClient:
+    def __init__(self, peripheral):
+        self.peripheral = peripheral
+        self.callback = None
+        self.tasks = set()
+
+    @property
+    def is_connected(self):
+        return self.peripheral.connected
+
+    async def connect(self):
+        await asyncio.sleep(self.peripheral.connect_delay)
+        self.peripheral.connect_count += 1
+        if self.peripheral.fail_connects > 0:
+            self.peripheral.fail_connects -= 1
+            raise ConnectionError(f"Device {self.peripheral.address} not found")
+        self.peripheral.connected = True
+
+    async def disconnect(self):
+        self.peripheral.connected = False
+        self.peripheral.binary = False
+        self.peripheral.paused = False
+
+    async def start_notify(self, uuid, callback):
+        self.callback = callback
+
+    async def stop_notify(self, uuid):
+        self.callback = None
+
+    async def write_gatt_char(self, uuid, data):
+        if not self.peripheral.connected:
+            raise ConnectionError(f"Device {self.peripheral.address} is not connected")
+        payload = self.peripheral.respond(data.decode())
+        if not payload:
+            return
+        task = asyncio.ensure_future(self._notify(payload))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _notify(self, payload):
+        mtu = self.peripheral.mtu
+        # A transfer ends with the connection it was started on
+        connection = self.peripheral.connect_count
+        for start in range(0, len(payload), mtu):
+            while self.peripheral.paused and self.peripheral.connected:
+                await asyncio.sleep(0.001)
+            if self.peripheral.chunk_interval:
+                await asyncio.sleep(self.peripheral.chunk_interval)
+            else:
+                await asyncio.sleep(0)
+            if self.callback is None or not self.peripheral.connected or self.peripheral.connect_count != connection:
+                return
+            self.callback(None, bytearray(payload[start:start + mtu]))
+
+# Client factory for BleDevice(..., client_factory=...) backed by simulated peripherals
+def simulated_client_factory(peripherals):
+    if isinstance(peripherals, SimulatedPeripheral):
+        peripherals = {peripherals.address: peripherals}
+
+    def factory(address):
+        return SimulatedBleakClient(peripherals[address])
+    return factory
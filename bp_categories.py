@@ -0,0 +1,122 @@
+import json
+import os
+import zlib
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+GUIDELINES_FILE = "bp_guidelines.json"
+DEFAULT_GUIDELINE = 'padrao'
+UNKNOWN = 'Unknown'
+UNKNOWN_COLOR = '#D3D3D3'
+
+# Built-in rule tables. Rules are evaluated in order and the first match wins;
+# a range [min, max] leaves out a bound when it is null, 'bounds' says which
+# ends it includes ('[)' by default, '[]', '(]' or '()'), and 'match' says
+# whether both pressures ('all') or either of them ('any') must be in range.
+# 'order' is the display order of the categories. Readings with a missing
+# pressure, or that no rule matches, are 'Unknown'.
+BOUNDS = ('[)', '[]', '(]', '()')
+
+GUIDELINES = {
+    # The app's original three categories, with their gaps and overlaps
+    'padrao': {
+        'order': ['Baixa', 'Normal', 'Alta'],
+        'colors': {'Baixa': '#CAF4FF', 'Normal': '#5AB2FF', 'Alta': '#FF8080'},
+        'rules': [
+            {'category': 'Baixa', 'systolic': [0, 100], 'diastolic': [0, 90], 'bounds': '[]'},
+            {'category': 'Normal', 'systolic': [90, 120], 'diastolic': [70, 80], 'bounds': '[]'},
+            {'category': 'Alta', 'systolic': [130, None], 'diastolic': [90, None], 'bounds': '[]'},
+        ],
+    },
+    # American Heart Association stages (2017 guideline)
+    'aha': {
+        'order': ['Normal', 'Elevada', 'Hipertensão estágio 1', 'Hipertensão estágio 2', 'Crise hipertensiva'],
+        'colors': {'Normal': '#5AB2FF', 'Elevada': '#FFE699', 'Hipertensão estágio 1': '#FFB366',
+                   'Hipertensão estágio 2': '#FF8080', 'Crise hipertensiva': '#C00000'},
+        'rules': [
+            {'category': 'Crise hipertensiva', 'systolic': [180, None], 'diastolic': [120, None], 'match': 'any', 'bounds': '(]'},
+            {'category': 'Hipertensão estágio 2', 'systolic': [140, None], 'diastolic': [90, None], 'match': 'any'},
+            {'category': 'Hipertensão estágio 1', 'systolic': [130, None], 'diastolic': [80, None], 'match': 'any'},
+            {'category': 'Elevada', 'systolic': [120, None]},
+            {'category': 'Normal'},
+        ],
+    },
+}
+
+def _bound(value, default):
+    return default if value is None else float(value)
+
+def _in_range(values, low, high, bounds):
+    above = values >= low if bounds[0] == '[' else values > low
+    below = values <= high if bounds[1] == ']' else values < high
+    return above & below
+
+# A guideline table compiled for evaluation over whole columns
+class CategoryRules:
+    def __init__(self, name, table):
+        self.name = name
+        self.order = list(table['order'])
+        self.categories = self.order + [UNKNOWN]
+        colors = table.get('colors', {})
+        self.colors = {category: colors.get(category, UNKNOWN_COLOR) for category in self.categories}
+        self.rules = []
+        for rule in table['rules']:
+            if rule['category'] not in self.order:
+                raise ValueError(f"Rule category {rule['category']!r} is not in the order of {name!r}")
+            if rule.get('match', 'all') not in ('all', 'any'):
+                raise ValueError(f"Invalid match {rule['match']!r} in {name!r}")
+            bounds = rule.get('bounds', '[)')
+            if bounds not in BOUNDS:
+                raise ValueError(f"Invalid bounds {bounds!r} in {name!r}")
+            ranges = [(column, _bound(rule[column][0], -np.inf), _bound(rule[column][1], np.inf), bounds)
+                      for column in ('systolic', 'diastolic') if column in rule]
+            self.rules.append((self.order.index(rule['category']), ranges, rule.get('match', 'all')))
+        # Stored aggregates are rebuilt when this changes
+        self.fingerprint = zlib.crc32(json.dumps([name, table], sort_keys=True).encode())
+
+    # Category of every (systolic, diastolic) pair, as a pandas Categorical
+    def categorize(self, systolic, diastolic):
+        columns = {'systolic': np.asarray(systolic, dtype=np.float64),
+                   'diastolic': np.asarray(diastolic, dtype=np.float64)}
+        known = ~(np.isnan(columns['systolic']) | np.isnan(columns['diastolic']))
+        conditions = []
+        codes = []
+        for code, ranges, match in self.rules:
+            in_range = [_in_range(columns[column], low, high, bounds) for column, low, high, bounds in ranges]
+            if not in_range:
+                condition = known
+            elif match == 'all':
+                condition = known & np.logical_and.reduce(in_range)
+            else:
+                condition = known & np.logical_or.reduce(in_range)
+            conditions.append(condition)
+            codes.append(code)
+        category_codes = np.select(conditions, codes, default=len(self.order)) if conditions \
+            else np.full(known.shape, len(self.order))
+        return pd.Categorical.from_codes(category_codes.astype(np.int8), categories=self.categories, ordered=True)
+
+    # Category column for a DataFrame with the pressure columns of data.csv
+    def categorize_frame(self, data):
+        return pd.Series(self.categorize(data['Systolic_Pressure'], data['Diastolic_Pressure']), index=data.index)
+
+# Rule table by name, from the built-in tables or a bp_guidelines.json of the form
+# {"active": "aha", "guidelines": {"name": {"order": [...], "colors": {...}, "rules": [...]}}}
+@lru_cache(maxsize=None)
+def load_category_rules(name=None, config_file=GUIDELINES_FILE):
+    guidelines = dict(GUIDELINES)
+    active = DEFAULT_GUIDELINE
+    if os.path.exists(config_file):
+        with open(config_file) as file:
+            config = json.load(file)
+        guidelines.update(config.get('guidelines', {}))
+        active = config.get('active', active)
+    name = name or active
+    if name not in guidelines:
+        raise ValueError(f"Unknown blood pressure guideline {name!r}")
+    return CategoryRules(name, guidelines[name])
+
+# Categorize a single blood pressure reading
+def categorize_blood_pressure(systolic, diastolic, rules=None):
+    rules = rules or load_category_rules()
+    return rules.categorize([systolic], [diastolic])[0]
@@ -0,0 +1,134 @@
+import os
+import time
+import numpy as np
+from preprocessing import DESIRED_NUM_VALUES, preprocess_signal
+from inference_backends import DEFAULT_BACKEND, load_backend
+
+MODEL_PATH = 'C:/Users/wgabr/Python Codes/BiomedApp/model'
+BATCH_SIZE = 64
+WARMUP_BATCH_SIZES = (1, BATCH_SIZE)
+# Transforms a model declares for its outputs (see model_registry.py)
+TRANSFORMS = {
+    None: None,
+    'exp': np.exp,
+}
+
+# Long-lived blood pressure predictor: the model is loaded once per process
+# through an inference backend (see inference_backends.py) and reused for
+# every reading. Loading ends with a warm-up call on dummy input for each
+# batch size in warmup_batch_sizes, so tracing and compilation are paid at
+# startup rather than by the first reading.
+class BPPredictor:
+    def __init__(self, model_path=MODEL_PATH, systolic_index=1, diastolic_index=0, backend=DEFAULT_BACKEND,
+                 warmup_batch_sizes=WARMUP_BATCH_SIZES, input_length=DESIRED_NUM_VALUES, transform=None, num_threads=None):
+        if transform not in TRANSFORMS:
+            raise ValueError(f"Unknown output transform {transform!r}, expected one of {sorted(map(str, TRANSFORMS))}")
+        self.model_path = model_path
+        self.systolic_index = systolic_index
+        self.diastolic_index = diastolic_index
+        self.input_length = input_length
+        self.transform = transform
+        self.num_threads = num_threads
+        self.backend_name = backend
+        self.warmup_batch_sizes = warmup_batch_sizes
+        self.backend = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.first_predict_seconds = None
+        self.warm_predict_seconds = []
+
+    def load(self):
+        if self.backend is None:
+            start_time = time.perf_counter()
+            backend = load_backend(self.backend_name, self.model_path, self.num_threads)
+            self.load_seconds = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            for batch_size in self.warmup_batch_sizes:
+                backend.run(np.zeros((batch_size, self.input_length, 1), dtype=np.float32))
+            self.warmup_seconds = time.perf_counter() - start_time
+            self.backend = backend
+        return self
+
+    # Identifies what this predictor computes, for caching its results: the
+    # model (and when its files last changed), backend and output handling
+    @property
+    def model_id(self):
+        files = [self.model_path, os.path.join(self.model_path, 'saved_model.pb')]
+        modified = max((os.path.getmtime(file) for file in files if os.path.exists(file)), default=0)
+        return (f"{self.model_path}@{modified:.0f}|{self.backend_name}|{self.input_length}|"
+                f"{self.systolic_index},{self.diastolic_index}|{self.transform}")
+
+    # Pressures in [systolic, diastolic] columns, after the output transform
+    def _pressures(self, outputs):
+        pressures = outputs[:, [self.systolic_index, self.diastolic_index]]
+        transform = TRANSFORMS[self.transform]
+        return transform(pressures) if transform else pressures
+
+    def _run(self, input_array):
+        return self.backend.run(input_array)
+
+    def predict(self, ppg_samples):
+        self.load()
+        start_time = time.perf_counter()
+
+        scaled_signal = preprocess_signal(ppg_samples, self.input_length)
+        pressures = self._pressures(self._run(scaled_signal.reshape(1, -1, 1)))
+
+        elapsed = time.perf_counter() - start_time
+        if self.first_predict_seconds is None:
+            self.first_predict_seconds = elapsed
+        else:
+            self.warm_predict_seconds.append(elapsed)
+
+        systolic_pressure = float(pressures[0, 0])
+        diastolic_pressure = float(pressures[0, 1])
+        return systolic_pressure, diastolic_pressure
+
+    # Predict many already-preprocessed signals, shape [N, input_length] or [N, input_length, 1],
+    # running the signature once per batch instead of once per record
+    def predict_batch(self, scaled_signals, batch_size=BATCH_SIZE):
+        self.load()
+        scaled_signals = np.asarray(scaled_signals, dtype=np.float32)
+        scaled_signals = scaled_signals.reshape(len(scaled_signals), -1, 1)
+
+        outputs = []
+        for start in range(0, len(scaled_signals), batch_size):
+            batch = scaled_signals[start:start + batch_size]
+            if self.backend.fixed_batch and 1 < len(batch) < batch_size:
+                # Pad to the warmed-up shape rather than compile another one
+                padded = np.zeros((batch_size,) + batch.shape[1:], dtype=np.float32)
+                padded[:len(batch)] = batch
+                outputs.append(self._run(padded)[:len(batch)])
+            else:
+                outputs.append(self._run(batch))
+        if not outputs:
+            return np.empty((0, 2), dtype=np.float32)
+
+        return self._pressures(np.concatenate(outputs))
+
+    # Cold start (import + model load + first call) and warm path are reported separately
+    def latency_report(self):
+        warm = self.warm_predict_seconds
+        return {
+            'model_path': self.model_path,
+            'backend': self.backend_name,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds,
+            'first_predict_seconds': self.first_predict_seconds,
+            'cold_start_seconds': (self.load_seconds or 0.0) + (self.warmup_seconds or 0.0) + (self.first_predict_seconds or 0.0),
+            'warm_predict_count': len(warm),
+            'warm_predict_mean_seconds': float(np.mean(warm)) if warm else None,
+            'warm_predict_p95_seconds': float(np.percentile(warm, 95)) if warm else None,
+        }
+
+# Module-level predictors shared by everything running in this process
+_predictors = {}
+
+def get_predictor(model_path=MODEL_PATH, systolic_index=1, diastolic_index=0, backend=DEFAULT_BACKEND,
+                  input_length=DESIRED_NUM_VALUES, transform=None, num_threads=None):
+    key = (model_path, systolic_index, diastolic_index, backend, input_length, transform, num_threads)
+    if key not in _predictors:
+        _predictors[key] = BPPredictor(model_path, systolic_index, diastolic_index, backend,
+                                       input_length=input_length, transform=transform, num_threads=num_threads).load()
+    return _predictors[key]
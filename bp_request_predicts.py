@@ -1,89 +1,67 @@
-import tensorflow as tf
-import numpy as np
+import sys
 import pandas as pd
-from datetime import datetime
-from scipy.signal import cheby2, filtfilt
-from scipy.interpolate import interp1d
-
-# Function to process and predict for a single measure
-def process_and_predict(timestamp, values):
-    ppg_signal = np.array(values) * -1
-
-    # 4th order Chebyshev-II bandpass filter
-    num_values = len(ppg_signal)
-    fs = num_values / 10
-    lowcut = 0.5
-    highcut = 8.0
-    nyquist = 0.5 * fs
-    low = lowcut / nyquist
-    high = highcut / nyquist
-
-    b, a = cheby2(4, 40, [low, high], btype='bandpass')
-
-    # Apply the filter to the PPG signal
-    filtered_signal = filtfilt(b, a, ppg_signal)
-
-    # Interpolate the signal to a specific number of values
-    desired_num_values = 1250  # Expected number of values
-    x = np.linspace(0, 1, num=len(filtered_signal))  # Normalized time axis
-    x_new = np.linspace(0, 1, num=desired_num_values)  # New normalized time axis
-    f = interp1d(x, filtered_signal, kind='cubic')  # Cubic interpolation
-    interpolated_signal = f(x_new)
-
-    # Scale the filtered signal between 0 and 1
-    scaled_signal = (interpolated_signal - np.min(interpolated_signal)) / (np.max(interpolated_signal) - np.min(interpolated_signal))
-
-    # Prepare the data for the model
-    scaled_signal = np.array(scaled_signal, dtype=np.float32)
-    data = tf.reshape(scaled_signal, [1, -1, 1])
-
-    # Prepare the input as a tensor
-    input_tensor = tf.convert_to_tensor(data, dtype=tf.float32)
-
-    # Make prediction
-    prediction = infer(input_tensor)
-
-    # Extract prediction result from the tensor
-    predictions = [pred.numpy()[0][0] for pred in prediction.values()]
-
-    # Convert prediction to systolic and diastolic pressure with three decimal places
-    systolic_pressure = f"{float(predictions[0]):.3f}"
-    diastolic_pressure = f"{float(predictions[1]):.3f}"
-
-    return "", timestamp, systolic_pressure, diastolic_pressure
-
-# Read the data from the .txt file
-data_file = 'requested_measures.txt'
-with open(data_file, 'r') as file:
-    data = file.readlines()
-
-# Load the model using tf.saved_model.load
-model_path = 'C:/Users/wgabr/Python Codes/BiomedApp/model'
-model = tf.saved_model.load(model_path)
-
-# Assuming the model has a default serving signature
-infer = model.signatures['serving_default']
-
-# Process each line and predict
-results = []
-for line in data:
+from bp_predictor import BATCH_SIZE
+from model_registry import get_model_predictor
+from ppg_parser import parse_measurement_file
+from pipeline import MeasurementPipeline, RESULT_COLUMNS
+from measure_journal import JOURNAL_FILE, open_journal
+from ble_hub import load_sampling_rates
+from prediction_cache import CACHE_FILE, PredictionCache
+from ingest_index import INDEX_FILE, IngestIndex
+
+# Read every stored measure from the .txt file as (timestamp, values) pairs
+def read_requested_measures(data_file='requested_measures.txt'):
+    return list(parse_measurement_file(data_file))
+
+# Predict every stored measure and add the results to the journal as pending
+# measures. The file is parsed lazily, so only one batch of samples is in
+# memory at a time. Should the process stop before the .txt file is cleared,
+# running it again adds nothing twice: the journal skips known record ids.
+# With workers > 1, preprocessing runs on that many threads or processes
+# (executor) and the per-stage throughput is printed. The sampling rate of
+# the device comes from devices.json when it declares one. Records the device
+# sent before are answered from the prediction cache (cache_file, None to
+# disable it) without filtering or inference, and records already taken in
+# are dropped on reading by the ingest index (index_file, None to disable it).
+def predict_requested_measures(predictor, data_file='requested_measures.txt', journal_file=JOURNAL_FILE, batch_size=BATCH_SIZE, device_id='',
+                               workers=1, executor='thread', cache_file=CACHE_FILE, index_file=INDEX_FILE):
+    journal = open_journal(journal_file)
+    cache = PredictionCache(cache_file) if cache_file else None
+    ingest_index = IngestIndex(index_file) if index_file else None
     try:
-        line = line.strip().strip('()')  # Remove leading and trailing parentheses
-        timestamp_str, values_str = line.split(', ', 1)
-        timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-        values = eval(values_str)
-        results.append(process_and_predict(timestamp, values))
-    except Exception as e:
-        print(f"Error processing line: {line}")
-        print(e)
-
-# Create a DataFrame from the results
-df = pd.DataFrame(results, columns=['Name', 'Date_of_Measurement', 'Systolic_Pressure', 'Diastolic_Pressure'])
-df['Name'] = df['Name'].astype(str)
-
-# Append the DataFrame to the CSV file
-df.to_csv("requested_measures.csv", mode='a', index=False, header=False)
-
-# Clear the contents of the .txt file
-with open(data_file, 'w') as file:
-    file.write("")
\ No newline at end of file
+        pipeline = MeasurementPipeline(predictor, journal=journal, batch_size=batch_size, sampling_rates=load_sampling_rates(),
+                                       cache=cache, ingest_index=ingest_index)
+        records = parse_measurement_file(data_file)
+        if workers > 1:
+            results = list(pipeline.run_parallel(records, device_id, workers, executor))
+            for stage, times in pipeline.stage_times.report().items():
+                print(f"{stage}: {times['records']} records in {times['seconds']} s, {times['records_per_second']} records/s")
+        else:
+            results = list(pipeline.run_stream(records, device_id))
+        if cache is not None:
+            print(f"Prediction cache: {cache.stats()}")
+        if ingest_index is not None:
+            print(f"Ingest index: {ingest_index.stats()}")
+    finally:
+        journal.close()
+        if cache is not None:
+            cache.close()
+        if ingest_index is not None:
+            ingest_index.close()
+
+    # Clear the contents of the .txt file
+    with open(data_file, 'w') as file:
+        file.write("")
+
+    df = pd.DataFrame([result.as_row() for result in results], columns=RESULT_COLUMNS)
+    return df
+
+if __name__ == "__main__":
+    # Optional batch size, model name, workers and executor:
+    # python bp_request_predicts.py 128 model_new 8 process
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else BATCH_SIZE
+    model_name = sys.argv[2] if len(sys.argv) > 2 else None
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    executor = sys.argv[4] if len(sys.argv) > 4 else 'thread'
+    predictor = get_model_predictor(model_name)
+    predict_requested_measures(predictor, batch_size=batch_size, workers=workers, executor=executor)
@@ -0,0 +1,68 @@
+import numpy as np
+
+# Width the charts are drawn at; Streamlit does not report the container width
+CHART_WIDTH = 800
+# Narrowest bar, in pixels, before counts are merged into coarser bins
+MIN_BAR_PIXELS = 4
+COUNT_FREQUENCIES = ['h', 'D', 'W', 'MS', 'QS', 'YS']
+
+# Largest-Triangle-Three-Buckets: keeps the first and last points and, from each
+# of the threshold - 2 buckets in between, the point forming the largest
+# triangle with the previously kept point and the average of the next bucket
+def lttb_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+        areas = np.abs((x[a] - average_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (average_y - y[a]))
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+# Min-max decimation: the lowest and highest point of each of n_buckets equal
+# buckets, so spikes survive however far the series is reduced
+def minmax_indices(y, n_buckets):
+    n = len(y)
+    if 2 * n_buckets >= n or n_buckets < 1:
+        return np.arange(n)
+    buckets = np.arange(n) * n_buckets // n
+    order = np.lexsort((np.asarray(y), buckets))
+    starts = np.searchsorted(buckets[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+# At most max_points rows of data[[time_column, value_column]], chosen by LTTB or min-max
+def downsample(data, time_column, value_column, max_points=CHART_WIDTH, method='lttb'):
+    series = data[[time_column, value_column]].dropna()
+    if len(series) <= max_points:
+        return series
+    if method == 'lttb':
+        indices = lttb_indices(series[time_column].to_numpy().astype('datetime64[ns]').astype(np.int64),
+                               series[value_column].to_numpy(), max_points)
+    elif method == 'minmax':
+        indices = minmax_indices(series[value_column].to_numpy(), max_points // 2)
+    else:
+        raise ValueError(f"Unknown downsampling method {method!r}")
+    return series.iloc[indices]
+
+# Merge time-binned counts into the finest of COUNT_FREQUENCIES (not finer than
+# min_frequency) that leaves at most max_bars bars
+def bin_counts(counts, time_column, count_column='Count', max_bars=CHART_WIDTH // MIN_BAR_PIXELS, min_frequency='h'):
+    times = counts.set_index(time_column)[count_column]
+    for frequency in COUNT_FREQUENCIES[COUNT_FREQUENCIES.index(min_frequency):]:
+        binned = times.resample(frequency).sum()
+        binned = binned[binned > 0]
+        if len(binned) <= max_bars:
+            break
+    return binned.rename_axis(time_column).reset_index(), frequency
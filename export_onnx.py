@@ -0,0 +1,38 @@
+import sys
+import numpy as np
+from bp_predictor import BPPredictor
+from inference_backends import OnnxBackend
+from model_registry import get_model_spec, model_names
+from preprocessing import preprocess_signals
+from synthetic_data_generator import synthetic_ppg
+
+# Largest difference, in mmHg, accepted between the ONNX export and the SavedModel
+PARITY_TOLERANCE = 0.01
+
+# Export a registered model's SavedModel to <path>.onnx
+def export_model(name, opset=13):
+    spec = get_model_spec(name)
+    backend = OnnxBackend(spec.path)
+    backend.convert(opset)
+    return backend.onnx_path
+
+# Run the SavedModel and its ONNX export over the same synthetic PPG signals
+# and return the largest absolute difference between their predictions
+def check_parity(name, num_signals=64, tolerance=PARITY_TOLERANCE):
+    spec = get_model_spec(name)
+    scaled_signals = preprocess_signals(synthetic_ppg(num_signals), spec.input_length)
+    predictions = {}
+    for backend in ('savedmodel', 'onnx'):
+        predictor = BPPredictor(spec.path, spec.systolic_index, spec.diastolic_index, backend,
+                                warmup_batch_sizes=(1,), input_length=spec.input_length, transform=spec.transform)
+        predictions[backend] = predictor.load().predict_batch(scaled_signals)
+    difference = float(np.abs(predictions['onnx'] - predictions['savedmodel']).max())
+    if difference > tolerance:
+        raise ValueError(f"ONNX export of {name!r} differs from the SavedModel by {difference:.4f} mmHg")
+    return difference
+
+if __name__ == "__main__":
+    # python export_onnx.py [model_name ...]; every registered model by default
+    for name in sys.argv[1:] or model_names():
+        print(f"{name}: exported to {export_model(name)}")
+        print(f"{name}: largest difference from the SavedModel {check_parity(name):.5f} mmHg")
@@ -0,0 +1,151 @@
+import os
+import subprocess
+import sys
+import numpy as np
+
+DEFAULT_BACKEND = 'savedmodel'
+
+# Every backend returns one column per model output, in output-name order
+# (the order the SavedModel signature returns them in). TensorFlow is imported
+# on load, so choosing a backend costs nothing until a model is used; the ONNX
+# backend does not import it at all once the model is converted.
+# num_threads caps the intra-op threads of the backends that support it.
+
+# The reference: the SavedModel serving signature, run eagerly
+class SavedModelBackend:
+    # Backends with fixed_batch compile per input shape, so callers pad the
+    # last batch instead of triggering a new compilation for its size
+    fixed_batch = False
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.model = None
+        self.infer = None
+
+    def load(self):
+        import tensorflow as tf
+        if self.num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(self.num_threads)
+            except RuntimeError:
+                pass  # TensorFlow is already initialized in this process
+        self.model = tf.saved_model.load(self.model_path)
+        self.infer = self.model.signatures['serving_default']
+        return self
+
+    @staticmethod
+    def _columns(outputs):
+        return np.stack([np.asarray(outputs[name])[:, 0] for name in sorted(outputs)], axis=1)
+
+    def run(self, batch):
+        import tensorflow as tf
+        prediction = self.infer(tf.convert_to_tensor(batch, dtype=tf.float32))
+        return self._columns({name: value.numpy() for name, value in prediction.items()})
+
+# The serving signature wrapped in an XLA-compiled tf.function; compiled once
+# per batch shape, on warm-up
+class XlaBackend(SavedModelBackend):
+    fixed_batch = True
+
+    def load(self):
+        import tensorflow as tf
+        super().load()
+        infer = self.infer
+        self.compiled = tf.function(lambda batch: infer(batch), jit_compile=True)
+        return self
+
+    def run(self, batch):
+        import tensorflow as tf
+        prediction = self.compiled(tf.convert_to_tensor(batch, dtype=tf.float32))
+        return self._columns({name: value.numpy() for name, value in prediction.items()})
+
+# TFLite conversion of the SavedModel with float16 weights or dynamic-range
+# int8 weights. The converted model is cached next to the SavedModel.
+class TFLiteBackend:
+    fixed_batch = True
+
+    def __init__(self, model_path, quantization='float16', num_threads=None):
+        if quantization not in ('float16', 'int8'):
+            raise ValueError(f"Unknown TFLite quantization {quantization!r}")
+        self.model_path = model_path
+        self.quantization = quantization
+        self.num_threads = num_threads
+        self.tflite_path = f"{model_path.rstrip('/')}.{quantization}.tflite"
+        self.runner = None
+
+    def convert(self):
+        import tensorflow as tf
+        converter = tf.lite.TFLiteConverter.from_saved_model(self.model_path)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if self.quantization == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        # Ops without a TFLite kernel fall back to TensorFlow ones
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+        with open(self.tflite_path, 'wb') as file:
+            file.write(converter.convert())
+
+    def load(self):
+        import tensorflow as tf
+        if not os.path.exists(self.tflite_path):
+            self.convert()
+        self.interpreter = tf.lite.Interpreter(model_path=self.tflite_path, num_threads=self.num_threads)
+        self.runner = self.interpreter.get_signature_runner('serving_default')
+        self.input_name = next(iter(self.interpreter.get_signature_list()['serving_default']['inputs']))
+        return self
+
+    def run(self, batch):
+        outputs = self.runner(**{self.input_name: np.asarray(batch, dtype=np.float32)})
+        return SavedModelBackend._columns(outputs)
+
+# ONNX export of the SavedModel run by ONNX Runtime on CPU. Only onnxruntime
+# is imported to run it, which starts in a fraction of the time and memory of
+# TensorFlow. The exported model is cached next to the SavedModel; exporting
+# it (tf2onnx, which does import TensorFlow) happens once, on first load or
+# through export_onnx.py.
+class OnnxBackend:
+    fixed_batch = False
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.onnx_path = f"{model_path.rstrip('/')}.onnx"
+        self.session = None
+
+    # Run in a child process so the converting process never holds TensorFlow
+    def convert(self, opset=13):
+        subprocess.run([sys.executable, '-m', 'tf2onnx.convert', '--saved-model', self.model_path,
+                        '--signature_def', 'serving_default', '--opset', str(opset),
+                        '--output', self.onnx_path], check=True)
+
+    def load(self):
+        import onnxruntime as ort
+        if not os.path.exists(self.onnx_path):
+            self.convert()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        self.session = ort.InferenceSession(self.onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [output.name for output in self.session.get_outputs()]
+        return self
+
+    def run(self, batch):
+        outputs = self.session.run(self.output_names, {self.input_name: np.asarray(batch, dtype=np.float32)})
+        return SavedModelBackend._columns(dict(zip(self.output_names, outputs)))
+
+BACKENDS = {
+    'savedmodel': SavedModelBackend,
+    'xla': XlaBackend,
+    'tflite-float16': lambda model_path, num_threads=None: TFLiteBackend(model_path, 'float16', num_threads),
+    'tflite-int8': lambda model_path, num_threads=None: TFLiteBackend(model_path, 'int8', num_threads),
+    'onnx': OnnxBackend,
+}
+
+def load_backend(name, model_path, num_threads=None):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model_path, num_threads).load()
@@ -0,0 +1,145 @@
+import math
+import sqlite3
+import threading
+import numpy as np
+
+INDEX_FILE = "ingested.db"
+# Records the Bloom filter is sized for before it is rebuilt at twice the size,
+# and its false positive rate at that size
+CAPACITY = 1000000
+ERROR_RATE = 0.01
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingested (
+    Record_Id TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    Key TEXT PRIMARY KEY,
+    Value BLOB NOT NULL
+);
+"""
+
+# Bit array with num_hashes positions per key. Keys are record ids (hex sha1
+# prefixes, see measure_journal.record_id), already uniform, so the positions
+# come from two halves of the id by double hashing instead of rehashing.
+class BloomFilter:
+    def __init__(self, capacity=CAPACITY, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, keys):
+        first = np.array([int(key[:10], 16) for key in keys], dtype=np.uint64)
+        second = np.array([int(key[10:20], 16) | 1 for key in keys], dtype=np.uint64)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (first[:, None] + steps * second[:, None]) % np.uint64(self.num_bits)
+
+    def add(self, keys):
+        if len(keys):
+            positions = self._positions(keys).ravel()
+            np.bitwise_or.at(self.bits, positions >> np.uint64(3), (1 << (positions & np.uint64(7))).astype(np.uint8))
+
+    # True where every bit of the key is set: possibly present; False: certainly absent
+    def might_contain(self, keys):
+        if not len(keys):
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(keys)
+        return ((self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+
+# Record ids of every reading already taken in by the pipeline, so a device
+# resending its history is filtered before preprocessing and inference. The
+# ids are kept in an SQLite table; membership is answered by a Bloom filter in
+# memory (about 1.2 MB per million records at 1% false positives) and only
+# the ids it reports as present are confirmed in the table. New readings
+# therefore cost a few bit lookups, and the table is only read for real
+# duplicates and the rare false positive. The filter is saved on close and
+# rebuilt from the table when it is missing, stale or full.
+class IngestIndex:
+    def __init__(self, index_file=INDEX_FILE, capacity=CAPACITY, error_rate=ERROR_RATE):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(index_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.count = self.connection.execute("SELECT COUNT(*) FROM ingested").fetchone()[0]
+        self.checked = 0
+        self.duplicates = 0
+        self.false_positives = 0
+        self.bloom = self._load_bloom(capacity, error_rate)
+
+    def _meta(self, key):
+        row = self.connection.execute("SELECT Value FROM meta WHERE Key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _load_bloom(self, capacity, error_rate):
+        saved_count = self._meta('bloom_count')
+        saved_capacity = self._meta('bloom_capacity')
+        if saved_count is not None and int(saved_count) == self.count and int(saved_capacity) >= self.count:
+            bloom = BloomFilter(int(saved_capacity), error_rate)
+            bits = np.frombuffer(self._meta('bloom_bits'), dtype=np.uint8).copy()
+            if len(bits) == len(bloom.bits):
+                bloom.bits = bits
+                return bloom
+        return self._rebuild(max(capacity, 2 * self.count), error_rate)
+
+    def _rebuild(self, capacity, error_rate):
+        bloom = BloomFilter(capacity, error_rate)
+        cursor = self.connection.execute("SELECT Record_Id FROM ingested")
+        while True:
+            rows = cursor.fetchmany(100000)
+            if not rows:
+                return bloom
+            bloom.add([row[0] for row in rows])
+
+    # For each record id, whether it was already ingested
+    def seen(self, record_ids):
+        with self.lock:
+            seen = np.zeros(len(record_ids), dtype=bool)
+            candidates = np.flatnonzero(self.bloom.might_contain(record_ids))
+            for start in range(0, len(candidates), 500):
+                chunk = [record_ids[i] for i in candidates[start:start + 500]]
+                found = {row[0] for row in self.connection.execute(
+                    f"SELECT Record_Id FROM ingested WHERE Record_Id IN ({', '.join('?' * len(chunk))})", chunk)}
+                for i, record in zip(candidates[start:start + 500], chunk):
+                    seen[i] = record in found
+            self.checked += len(record_ids)
+            self.duplicates += int(seen.sum())
+            self.false_positives += len(candidates) - int(seen.sum())
+            return seen
+
+    def add(self, record_ids):
+        record_ids = list(record_ids)
+        if not record_ids:
+            return
+        with self.lock:
+            with self.connection:
+                before = self.connection.total_changes
+                self.connection.executemany("INSERT OR IGNORE INTO ingested VALUES (?)", [(record,) for record in record_ids])
+                self.count += self.connection.total_changes - before
+            self.bloom.add(record_ids)
+            if self.count > self.bloom.capacity:
+                self.bloom = self._rebuild(max(2 * self.bloom.capacity, 2 * self.count), self.bloom.error_rate)
+
+    def save(self):
+        with self.lock:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+                    ('bloom_count', self.count),
+                    ('bloom_capacity', self.bloom.capacity),
+                    ('bloom_bits', self.bloom.bits.tobytes()),
+                ])
+
+    def stats(self):
+        return {
+            'records': self.count,
+            'checked': self.checked,
+            'duplicates': self.duplicates,
+            'false_positives': self.false_positives,
+            'bloom_bytes': len(self.bloom.bits),
+        }
+
+    def close(self):
+        self.save()
+        self.connection.close()
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+JOURNAL_FILE = "measures.journal"
+JOURNAL_COLUMNS = ['Record_Id', 'Name', 'Date_of_Measurement', 'Systolic_Pressure', 'Diastolic_Pressure', 'Device', 'Quality']
+# Compact once the file holds this many events and most of them are history
+COMPACT_AFTER = 10000
+
+# Stable id of a device reading: the same measurement received twice (a
+# retried transfer, a re-run script) gets the same id and is recorded once
+def record_id(device, timestamp, samples):
+    digest = hashlib.sha1(f"{device}|{timestamp:%Y-%m-%d %H:%M:%S}|".encode())
+    digest.update(np.ascontiguousarray(samples, dtype=np.int64).tobytes())
+    return digest.hexdigest()[:20]
+
+# Id for rows that only exist as results (the legacy CSV files)
+def row_record_id(row):
+    return hashlib.sha1("|".join(str(row.get(column, '')) for column in JOURNAL_COLUMNS[2:6]).encode()).hexdigest()[:20]
+
+# Append-only journal of the measures waiting to be assigned to a patient.
+# Every state change is one JSON line:
+#   {"op": "pending", "record": {...}}    predicted, waiting for a name
+#   {"op": "named", "record": {...}}      named (and possibly edited), ready for the store
+#   {"op": "committed", "ids": [...]}     written to the measurement store
+# Each call appends its events with one write and one fsync, and replaying
+# the file on open rebuilds the state. A line torn by a crash can only be the
+# last one and is dropped. Record ids make every transition idempotent:
+# replaying, re-receiving or re-committing a record does not duplicate it.
+# Committed ids are only remembered until the next compaction; a record
+# re-received after that is stopped by the ingest index and the store's
+# Record_Id dedup instead. Nothing is ever rewritten in place; the file is
+# only replaced by compaction.
+class MeasureJournal:
+    def __init__(self, journal_file=JOURNAL_FILE, fsync=True, compact_after=COMPACT_AFTER):
+        self.journal_file = journal_file
+        self.fsync = fsync
+        self.compact_after = compact_after
+        self.lock = threading.Lock()
+        self.records = {}  # Record_Id -> (state, record) for records not yet committed
+        self.committed = set()  # Record_Id committed since the last compaction
+        self.events = 0
+        self._replay()
+        self.file = open(journal_file, 'a', encoding='utf-8')
+
+    def _replay(self):
+        if not os.path.exists(self.journal_file):
+            return
+        valid_bytes = 0
+        with open(self.journal_file, 'rb') as file:
+            for line in file:
+                if not line.endswith(b'\n'):
+                    print(f"Dropping an incomplete event at the end of {self.journal_file}")
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    raise ValueError(f"Corrupt event in {self.journal_file} at byte {valid_bytes}")
+                self._apply(event)
+                valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(self.journal_file):
+            os.truncate(self.journal_file, valid_bytes)
+
+    def _apply(self, event):
+        self.events += 1
+        if event['op'] == 'committed':
+            for record in event['ids']:
+                self.records.pop(record, None)
+                self.committed.add(record)
+        elif event['record']['Record_Id'] not in self.committed:
+            self.records[event['record']['Record_Id']] = (event['op'], event['record'])
+
+    def _write(self, events):
+        if not events:
+            return
+        self.file.write(''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events))
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        for event in events:
+            self._apply(event)
+        if self.events > self.compact_after and self.events > 2 * (len(self.records) + 1):
+            self._compact()
+
+    # Rewrite the journal as the current state, one event per live record, so
+    # its size follows the pending work and not the history. The new file
+    # replaces the old one atomically.
+    def _compact(self):
+        temporary_file = self.journal_file + '.tmp'
+        events = [{'op': state, 'record': record} for state, record in self.records.values()]
+        with open(temporary_file, 'w', encoding='utf-8') as file:
+            file.write(''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events))
+            file.flush()
+            os.fsync(file.fileno())
+        self.file.close()
+        os.replace(temporary_file, self.journal_file)
+        self.file = open(self.journal_file, 'a', encoding='utf-8')
+        self.committed = set()
+        self.events = len(events)
+
+    # Journal form of a row, or None when a pressure is missing (e.g. a cell
+    # cleared in the pending editor)
+    @staticmethod
+    def _record(row):
+        record = {column: row.get(column, '') for column in JOURNAL_COLUMNS}
+        for column in ('Name', 'Device'):
+            record[column] = '' if pd.isna(record[column]) else str(record[column])
+        for column in ('Systolic_Pressure', 'Diastolic_Pressure'):
+            pressure = record[column]
+            if pressure is None or pressure == '' or pd.isna(pressure):
+                return None
+            record[column] = float(pressure)
+        # Signal quality score, absent for measures recorded before it existed
+        quality = record['Quality']
+        record['Quality'] = None if quality is None or quality == '' or pd.isna(quality) else round(float(quality), 3)
+        if not isinstance(record['Date_of_Measurement'], str):
+            record['Date_of_Measurement'] = pd.Timestamp(record['Date_of_Measurement']).strftime('%Y-%m-%d %H:%M:%S')
+        if not isinstance(record['Record_Id'], str) or not record['Record_Id']:
+            record['Record_Id'] = row_record_id(record)
+        return record
+
+    @staticmethod
+    def _rows(rows):
+        return rows.to_dict('records') if isinstance(rows, pd.DataFrame) else list(rows)
+
+    # New predicted measures; ones already in the journal or without pressures
+    # are skipped. Returns how many were added.
+    def add_pending(self, rows):
+        with self.lock:
+            events = []
+            seen = set()
+            for row in self._rows(rows):
+                record = self._record(row)
+                if record is None:
+                    continue
+                if record['Record_Id'] not in self.records and record['Record_Id'] not in self.committed \
+                        and record['Record_Id'] not in seen:
+                    seen.add(record['Record_Id'])
+                    events.append({'op': 'pending', 'record': record})
+            self._write(events)
+            return len(events)
+
+    # Pending measures given a patient name, with any values edited on screen.
+    # Rows whose pressures were cleared stay pending. Returns how many were named.
+    def name(self, rows):
+        with self.lock:
+            events = []
+            for row in self._rows(rows):
+                record = self._record(row)
+                if record is not None and record['Record_Id'] in self.records and record['Name'].strip():
+                    events.append({'op': 'named', 'record': record})
+            self._write(events)
+            return len(events)
+
+    def mark_committed(self, record_ids):
+        with self.lock:
+            record_ids = [record for record in record_ids if record in self.records]
+            if record_ids:
+                self._write([{'op': 'committed', 'ids': record_ids}])
+            return len(record_ids)
+
+    def _frame(self, state):
+        with self.lock:
+            rows = [record for record_state, record in self.records.values() if record_state == state]
+        return pd.DataFrame(rows, columns=JOURNAL_COLUMNS)
+
+    def pending(self):
+        return self._frame('pending')
+
+    def named(self):
+        return self._frame('named')
+
+    def close(self):
+        self.file.close()
+
+    # One-shot import of the CSV files used before the journal: pending rows of
+    # requested_measures.csv and the named rows left in processed_measures.csv
+    def migrate_csv(self, requested_file="requested_measures.csv", processed_file="processed_measures.csv"):
+        migrated = 0
+        if os.path.exists(requested_file):
+            migrated += self.add_pending(pd.read_csv(requested_file))
+        if os.path.exists(processed_file):
+            processed = pd.read_csv(processed_file)
+            migrated += self.add_pending(processed)
+            self.name(processed)
+        return migrated
+
+def open_journal(journal_file=JOURNAL_FILE, requested_file="requested_measures.csv", processed_file="processed_measures.csv"):
+    exists = os.path.exists(journal_file)
+    journal = MeasureJournal(journal_file)
+    if not exists:
+        migrated = journal.migrate_csv(requested_file, processed_file)
+        if migrated:
+            print(f"Migrated {migrated} measures from {requested_file} and {processed_file} to {journal_file}")
+    return journal
@@ -0,0 +1,258 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+import pandas as pd
+from collections import Counter
+from patient_registry import PatientRegistry
+from bp_categories import load_category_rules
+
+STORE_FILE = "measurements.db"
+COLUMNS = ['Id', 'Name', 'Date_of_Measurement', 'Systolic_Pressure', 'Diastolic_Pressure']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    Id INTEGER NOT NULL,
+    Name TEXT NOT NULL,
+    Date_of_Measurement TEXT NOT NULL,
+    Systolic_Pressure REAL,
+    Diastolic_Pressure REAL,
+    Record_Id TEXT
+);
+CREATE INDEX IF NOT EXISTS measurements_id_date ON measurements (Id, Date_of_Measurement);
+CREATE INDEX IF NOT EXISTS measurements_date ON measurements (Date_of_Measurement);
+CREATE INDEX IF NOT EXISTS measurements_name ON measurements (Name);
+CREATE TABLE IF NOT EXISTS meta (
+    Key TEXT PRIMARY KEY,
+    Value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS category_counts (
+    Id INTEGER NOT NULL,
+    Category TEXT NOT NULL,
+    Count INTEGER NOT NULL,
+    PRIMARY KEY (Id, Category)
+);
+CREATE TABLE IF NOT EXISTS hourly_counts (
+    Hour TEXT PRIMARY KEY,
+    Count INTEGER NOT NULL
+);
+"""
+
+# Bumped whenever the layout of the aggregate tables changes, to rebuild them
+AGGREGATES_VERSION = 1
+# Bumped whenever patient Ids of stored measurements need merging again
+PATIENT_IDS_VERSION = 1
+
+DATE_FORMAT = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+
+# Dates are stored as 'YYYY-MM-DD HH:MM:SS' text, which sorts chronologically
+# and gives the hour as its first 13 characters; other strings are parsed
+def _format_date(value):
+    if isinstance(value, str) and DATE_FORMAT.fullmatch(value):
+        return value
+    return pd.Timestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+
+def _to_row(measurement):
+    record = measurement.get('Record_Id')
+    return (int(measurement['Id']), str(measurement['Name']), _format_date(measurement['Date_of_Measurement']),
+            float(measurement['Systolic_Pressure']), float(measurement['Diastolic_Pressure']),
+            record if isinstance(record, str) and record else None)
+
+# (Id, Category) -> count for a frame with Id and the pressure columns
+def _category_counts(data, rules):
+    categories = rules.categorize_frame(data)
+    counts = data.groupby([data['Id'], categories], observed=True).size()
+    return [(int(patient_id), category, int(count)) for (patient_id, category), count in counts.items()]
+
+# Indexed measurement store on SQLite. Appending a reading is a single insert
+# instead of rewriting the whole history, and per-patient range queries use the
+# (Id, Date_of_Measurement) index. Blood pressure category counts per patient
+# and measurement counts per hour are kept up to date in the same transaction
+# as every append, and the 'version' counter lets callers cache anything
+# derived from the store until the next append. Categories follow the active
+# guideline table; the counts are rebuilt when that table changes.
+class MeasurementStore:
+    def __init__(self, db_file=STORE_FILE, category_rules=None):
+        self.db_file = db_file
+        self.category_rules = category_rules or load_category_rules()
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._add_record_ids()
+        self.patients = PatientRegistry(self.connection, self.lock)
+        if self._meta('patient_ids') != PATIENT_IDS_VERSION:
+            self.merge_patient_ids()
+        if (self._meta('aggregates') != AGGREGATES_VERSION
+                or self._meta('category_rules') != self.category_rules.fingerprint):
+            self.rebuild_aggregates()
+
+    def close(self):
+        self.connection.close()
+
+    # Journaled measures carry a Record_Id, unique in the store (stores created
+    # before it get the column added)
+    def _add_record_ids(self):
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(measurements)")]
+        if 'Record_Id' not in columns:
+            self.connection.execute("ALTER TABLE measurements ADD COLUMN Record_Id TEXT")
+        self.connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS measurements_record_id ON measurements (Record_Id)")
+
+    def _existing_record_ids(self, record_ids):
+        existing = set()
+        for start in range(0, len(record_ids), 500):
+            chunk = record_ids[start:start + 500]
+            existing.update(row[0] for row in self.connection.execute(
+                f"SELECT Record_Id FROM measurements WHERE Record_Id IN ({', '.join('?' * len(chunk))})", chunk))
+        return existing
+
+    # Append one measurement (dict) or many (list of dicts or DataFrame).
+    # Measurements whose Record_Id is already stored are skipped, so replaying
+    # a journal commit cannot duplicate them. Returns the number appended.
+    def append(self, measurements):
+        if isinstance(measurements, dict):
+            measurements = [measurements]
+        elif isinstance(measurements, pd.DataFrame):
+            measurements = measurements.to_dict('records')
+        rows = [_to_row(measurement) for measurement in measurements]
+        with self.lock, self.connection:
+            record_ids = [row[5] for row in rows if row[5] is not None]
+            if record_ids:
+                existing = self._existing_record_ids(record_ids)
+                seen = set()
+                kept = []
+                for row in rows:
+                    if row[5] is None or (row[5] not in existing and row[5] not in seen):
+                        seen.add(row[5])
+                        kept.append(row)
+                rows = kept
+            if not rows:
+                return 0
+            pressures = pd.DataFrame([(row[0], row[3], row[4]) for row in rows], columns=['Id', 'Systolic_Pressure', 'Diastolic_Pressure'])
+            categories = _category_counts(pressures, self.category_rules)
+            hours = Counter(row[2][:13] + ':00:00' for row in rows)
+            self.connection.executemany(
+                "INSERT INTO measurements (Id, Name, Date_of_Measurement, Systolic_Pressure, Diastolic_Pressure, Record_Id) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.connection.executemany(
+                "INSERT INTO category_counts (Id, Category, Count) VALUES (?, ?, ?) "
+                "ON CONFLICT (Id, Category) DO UPDATE SET Count = Count + excluded.Count",
+                categories)
+            self.connection.executemany(
+                "INSERT INTO hourly_counts (Hour, Count) VALUES (?, ?) "
+                "ON CONFLICT (Hour) DO UPDATE SET Count = Count + excluded.Count", list(hours.items()))
+            self._bump_version()
+        return len(rows)
+
+    def _meta(self, key):
+        row = self.connection.execute("SELECT Value FROM meta WHERE Key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _bump_version(self):
+        self.connection.execute("INSERT INTO meta (Key, Value) VALUES ('version', 1) "
+                                "ON CONFLICT (Key) DO UPDATE SET Value = Value + 1")
+
+    # Recompute the aggregate tables from the measurements (stores created before
+    # them, or categorized with another guideline table)
+    def rebuild_aggregates(self, chunksize=1000000):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM category_counts")
+            self.connection.execute("DELETE FROM hourly_counts")
+            categories = Counter()
+            for chunk in pd.read_sql_query("SELECT Id, Systolic_Pressure, Diastolic_Pressure FROM measurements",
+                                           self.connection, chunksize=chunksize):
+                for patient_id, category, count in _category_counts(chunk, self.category_rules):
+                    categories[(patient_id, category)] += count
+            self.connection.executemany(
+                "INSERT INTO category_counts (Id, Category, Count) VALUES (?, ?, ?)",
+                [(patient_id, category, count) for (patient_id, category), count in categories.items()])
+            self.connection.execute(
+                "INSERT INTO hourly_counts (Hour, Count) "
+                "SELECT substr(Date_of_Measurement, 1, 13) || ':00:00', COUNT(*) FROM measurements GROUP BY 1")
+            self.connection.execute("INSERT OR REPLACE INTO meta (Key, Value) VALUES ('aggregates', ?)", (AGGREGATES_VERSION,))
+            self.connection.execute("INSERT OR REPLACE INTO meta (Key, Value) VALUES ('category_rules', ?)",
+                                    (self.category_rules.fingerprint,))
+            self._bump_version()
+
+    # Move the readings of a patient recorded under several Ids (or of two
+    # patients sharing one) to a single Id per patient (see
+    # PatientRegistry.merge_ids), and recount the aggregates when any moved
+    def merge_patient_ids(self):
+        moved = self.patients.merge_ids()
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (Key, Value) VALUES ('patient_ids', ?)", (PATIENT_IDS_VERSION,))
+        if moved:
+            self.rebuild_aggregates()
+        return moved
+
+    def version(self):
+        with self.lock:
+            return self._meta('version') or 0
+
+    # Number of measurements per blood pressure category, for one patient or everyone
+    def category_counts(self, patient_id=None):
+        if patient_id is None:
+            return self._read("SELECT Category, SUM(Count) AS Count FROM category_counts GROUP BY Category")
+        return self._read("SELECT Category, Count FROM category_counts WHERE Id = ?", (int(patient_id),))
+
+    # Number of measurements per hour, with Hour as datetime
+    def hourly_counts(self):
+        counts = self._read("SELECT Hour, Count FROM hourly_counts ORDER BY Hour")
+        counts['Hour'] = pd.to_datetime(counts['Hour'])
+        return counts
+
+    # The most recent measurements, oldest first
+    def recent(self, limit):
+        recent = self._read(f"SELECT {', '.join(COLUMNS)} FROM measurements ORDER BY rowid DESC LIMIT ?", (int(limit),))
+        return recent.iloc[::-1].reset_index(drop=True)
+
+    def _read(self, query, params=(), parse_dates=None):
+        with self.lock:
+            return pd.read_sql_query(query, self.connection, params=params, parse_dates=parse_dates)
+
+    # Measurements of one patient, optionally restricted to [start, end], sorted
+    # by Date_of_Measurement and with the dates already parsed
+    def query_patient(self, patient_id, start=None, end=None):
+        query = f"SELECT {', '.join(COLUMNS)} FROM measurements WHERE Id = ?"
+        params = [int(patient_id)]
+        if start is not None:
+            query += " AND Date_of_Measurement >= ?"
+            params.append(_format_date(start))
+        if end is not None:
+            query += " AND Date_of_Measurement <= ?"
+            params.append(_format_date(end))
+        return self._read(query + " ORDER BY Date_of_Measurement", params,
+                          parse_dates={'Date_of_Measurement': {'format': 'ISO8601'}})
+
+    def scan(self):
+        return self._read(f"SELECT {', '.join(COLUMNS)} FROM measurements ORDER BY rowid")
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+
+    # One-shot import of a legacy data.csv; skipped when the store already has
+    # data. A patient listed under several Ids keeps one of them.
+    def migrate_csv(self, csv_file="data.csv", chunksize=100000):
+        if self.count() > 0 or not os.path.exists(csv_file):
+            return 0
+        migrated = 0
+        for chunk in pd.read_csv(csv_file, chunksize=chunksize):
+            migrated += self.append(chunk.dropna(subset=['Id', 'Name', 'Date_of_Measurement']))
+        self.merge_patient_ids()
+        return migrated
+
+def open_store(db_file=STORE_FILE, csv_file="data.csv"):
+    store = MeasurementStore(db_file)
+    migrated = store.migrate_csv(csv_file)
+    if migrated:
+        print(f"Migrated {migrated} measurements from {csv_file} to {db_file}")
+    return store
+
+if __name__ == "__main__":
+    # python measurement_store.py [data.csv] [measurements.db]
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else "data.csv"
+    db_file = sys.argv[2] if len(sys.argv) > 2 else STORE_FILE
+    open_store(db_file, csv_file).close()
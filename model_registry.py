@@ -0,0 +1,127 @@
+import json
+import os
+import time
+from functools import lru_cache
+import numpy as np
+from bp_predictor import get_predictor
+from inference_backends import DEFAULT_BACKEND
+from preprocessing import DESIRED_NUM_VALUES, preprocess_signals
+
+MODELS_FILE = "models.json"
+MODEL_DIR = 'C:/Users/wgabr/Python Codes/BiomedApp'
+DEFAULT_MODEL = 'model'
+
+# Built-in models. Each one declares where it is, the input length it was
+# trained on, which model output (in output-name order, see
+# inference_backends.py) holds each pressure, and the transform applied to
+# the outputs. model_new was trained on log pressures, so its outputs are
+# exponentiated. An entry may also set 'num_threads' for the backends that
+# take a thread count (TFLite, ONNX Runtime).
+MODELS = {
+    'model': {
+        'path': f'{MODEL_DIR}/model',
+        'input_length': DESIRED_NUM_VALUES,
+        'outputs': {'systolic': 1, 'diastolic': 0},
+        'transform': None,
+        'backend': DEFAULT_BACKEND,
+    },
+    'model_new': {
+        'path': f'{MODEL_DIR}/model_new',
+        'input_length': DESIRED_NUM_VALUES,
+        'outputs': {'systolic': 1, 'diastolic': 0},
+        'transform': 'exp',
+        'backend': DEFAULT_BACKEND,
+    },
+}
+
+# One registry entry
+class ModelSpec:
+    def __init__(self, name, entry):
+        self.name = name
+        self.path = entry['path']
+        self.input_length = int(entry.get('input_length', DESIRED_NUM_VALUES))
+        self.systolic_index = int(entry['outputs']['systolic'])
+        self.diastolic_index = int(entry['outputs']['diastolic'])
+        self.transform = entry.get('transform')
+        self.backend = entry.get('backend', DEFAULT_BACKEND)
+        self.num_threads = entry.get('num_threads')
+
+    def __repr__(self):
+        return f"ModelSpec({self.name!r}, {self.path!r}, backend={self.backend!r})"
+
+# The built-in models, updated by an optional models.json:
+#   {"active": "model_new", "models": {"model_new": {"backend": "onnx", "num_threads": 2, ...}}}
+# Entries in the file replace the built-in ones key by key.
+@lru_cache(maxsize=None)
+def load_model_registry(config_file=MODELS_FILE):
+    models = {name: dict(entry) for name, entry in MODELS.items()}
+    active = DEFAULT_MODEL
+    if os.path.exists(config_file):
+        with open(config_file) as file:
+            config = json.load(file)
+        for name, entry in config.get('models', {}).items():
+            models.setdefault(name, {}).update(entry)
+        active = config.get('active', active)
+    specs = {name: ModelSpec(name, entry) for name, entry in models.items()}
+    if active not in specs:
+        raise ValueError(f"Unknown active model {active!r}, expected one of {sorted(specs)}")
+    return specs, active
+
+def model_names(config_file=MODELS_FILE):
+    return list(load_model_registry(config_file)[0])
+
+def active_model(config_file=MODELS_FILE):
+    return load_model_registry(config_file)[1]
+
+def get_model_spec(name=None, config_file=MODELS_FILE):
+    specs, active = load_model_registry(config_file)
+    name = name or active
+    if name not in specs:
+        raise ValueError(f"Unknown model {name!r}, expected one of {sorted(specs)}")
+    return specs[name]
+
+# The predictor for a registered model, loaded on first use and then shared by
+# everything in the process, so switching models does not reload either one
+def get_model_predictor(name=None, backend=None, config_file=MODELS_FILE):
+    spec = get_model_spec(name, config_file)
+    return get_predictor(spec.path, spec.systolic_index, spec.diastolic_index, backend or spec.backend,
+                         spec.input_length, spec.transform, spec.num_threads)
+
+# Run several models over the same raw signals: per model the load time (zero
+# when already loaded), the inference time per record and the predictions,
+# plus their mean absolute difference from the first model. Signals are
+# preprocessed once per input length, outside the timed section.
+def compare_models(signals, names=None, backend=None, config_file=MODELS_FILE):
+    names = names or model_names(config_file)
+    scaled_signals = {}
+    report = {}
+    reference = None
+    for name in names:
+        spec = get_model_spec(name, config_file)
+        if spec.input_length not in scaled_signals:
+            scaled_signals[spec.input_length] = preprocess_signals(signals, spec.input_length)
+
+        start_time = time.perf_counter()
+        predictor = get_model_predictor(name, backend, config_file)
+        load_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        predictions = predictor.predict_batch(scaled_signals[spec.input_length])
+        elapsed = time.perf_counter() - start_time
+
+        if reference is None:
+            reference = predictions
+        systolic_difference, diastolic_difference = np.abs(predictions - reference).mean(axis=0)
+        report[name] = {
+            'backend': predictor.backend_name,
+            'load_seconds': load_seconds,
+            'ms_per_record': 1000 * elapsed / max(len(signals), 1),
+            'predictions': predictions,
+            'systolic_mean': float(predictions[:, 0].mean()),
+            'diastolic_mean': float(predictions[:, 1].mean()),
+            # Share of readings with diastolic above systolic: a wrong output mapping
+            'inverted_fraction': float((predictions[:, 0] < predictions[:, 1]).mean()),
+            f'systolic_mae_vs_{names[0]}': float(systolic_difference),
+            f'diastolic_mae_vs_{names[0]}': float(diastolic_difference),
+        }
+    return report
@@ -0,0 +1,134 @@
+import threading
+
+PATIENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Name TEXT NOT NULL,
+    Normalized_Name TEXT NOT NULL UNIQUE
+);
+"""
+
+# Names typed by different operators ("maria  silva", "Maria Silva") map to one patient
+def normalize_name(name):
+    return ' '.join(str(name).split()).casefold()
+
+# Persistent name -> Id registry kept in the store database. It is loaded into
+# memory once and updated incrementally, so resolving K names costs O(K)
+# dictionary lookups plus one transaction for the names that are new. Ids come
+# from SQLite AUTOINCREMENT under a UNIQUE normalized name, so two sessions (or
+# processes) registering the same patient get the same Id and no Id is reused.
+class PatientRegistry:
+    def __init__(self, connection, lock):
+        self.connection = connection
+        self.lock = lock
+        self.connection.executescript(PATIENTS_SCHEMA)
+        self.patients = None  # normalized name -> (Id, display name)
+        self.load_lock = threading.Lock()
+
+    # Seed the registry from measurements recorded before it existed. The
+    # store merges the Ids of each patient first (merge_ids), so every name
+    # has one Id; a name still found under several keeps its lowest.
+    def _seed_from_measurements(self):
+        rows = self.connection.execute("SELECT MIN(Id), Name FROM measurements GROUP BY Name ORDER BY MIN(Id)").fetchall()
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO patients (Id, Name, Normalized_Name) VALUES (?, ?, ?)",
+            [(patient_id, name, normalize_name(name)) for patient_id, name in rows])
+
+    # New patients get Ids above every Id in the measurements, not only above
+    # the registered ones, so a new patient never takes over older readings
+    def _advance_sequence(self):
+        max_id = self.connection.execute("SELECT MAX(Id) FROM measurements").fetchone()[0]
+        if max_id is None:
+            return
+        if self.connection.execute("SELECT 1 FROM sqlite_sequence WHERE name = 'patients'").fetchone():
+            self.connection.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'patients' AND seq < ?", (max_id, max_id))
+        else:
+            self.connection.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('patients', ?)", (max_id,))
+
+    # Give every patient a single Id in the measurements. Readings recorded
+    # before the registry may carry several Ids for one name (data.csv lists
+    # Gabriel under 36 and 38) or one Id for two names. Each name keeps its
+    # registered Id, else its lowest Id no other name keeps, else a new Id, and
+    # its other readings are moved to it. Returns the number of readings moved.
+    def merge_ids(self):
+        with self.lock, self.connection:
+            registered = dict(self.connection.execute("SELECT Normalized_Name, Id FROM patients"))
+            groups = self.connection.execute("SELECT Id, Name FROM measurements GROUP BY Id, Name ORDER BY Id").fetchall()
+            sequence = self.connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'patients'").fetchone()
+
+            ids_by_name = {}
+            for patient_id, name in groups:
+                ids_by_name.setdefault(normalize_name(name), []).append(patient_id)
+            owners = {patient_id: normalized for normalized, patient_id in registered.items()}
+            next_id = max([sequence[0] if sequence else 0] + [patient_id for patient_id, name in groups] + list(owners)) + 1
+            kept = dict(registered)
+            for normalized, patient_ids in ids_by_name.items():
+                if normalized in kept:
+                    continue
+                free = [patient_id for patient_id in patient_ids if patient_id not in owners]
+                if free:
+                    kept[normalized] = free[0]
+                else:
+                    kept[normalized] = next_id
+                    next_id += 1
+                owners[kept[normalized]] = normalized
+
+            moves = [(kept[normalize_name(name)], patient_id, name) for patient_id, name in groups
+                     if kept[normalize_name(name)] != patient_id]
+            before = self.connection.total_changes
+            self.connection.executemany("UPDATE measurements SET Id = ? WHERE Id = ? AND Name = ?", moves)
+            moved = self.connection.total_changes - before
+        if moved:
+            self.patients = None
+        return moved
+
+    def load(self):
+        with self.lock, self.connection:
+            if self.connection.execute("SELECT COUNT(*) FROM patients").fetchone()[0] == 0:
+                self._seed_from_measurements()
+            self._advance_sequence()
+            rows = self.connection.execute("SELECT Id, Name, Normalized_Name FROM patients").fetchall()
+        self.patients = {normalized: (patient_id, name) for patient_id, name, normalized in rows}
+        return self
+
+    def _ensure_loaded(self):
+        if self.patients is None:
+            with self.load_lock:
+                if self.patients is None:
+                    self.load()
+
+    def get_id(self, name):
+        self._ensure_loaded()
+        patient = self.patients.get(normalize_name(name))
+        return patient[0] if patient else None
+
+    # Ids for a batch of names, registering the ones not seen before
+    def assign_ids(self, names):
+        self._ensure_loaded()
+        normalized_names = [normalize_name(name) for name in names]
+
+        missing = {}
+        for name, normalized in zip(names, normalized_names):
+            if normalized not in self.patients and normalized not in missing:
+                missing[normalized] = ' '.join(str(name).split())
+
+        if missing:
+            with self.lock, self.connection:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO patients (Name, Normalized_Name) VALUES (?, ?)",
+                    [(name, normalized) for normalized, name in missing.items()])
+                # Another session may have registered some of these names first
+                for normalized in missing:
+                    patient_id, name = self.connection.execute(
+                        "SELECT Id, Name FROM patients WHERE Normalized_Name = ?", (normalized,)).fetchone()
+                    self.patients[normalized] = (patient_id, name)
+
+        return [self.patients[normalized][0] for normalized in normalized_names]
+
+    def get_or_create(self, name):
+        return self.assign_ids([name])[0]
+
+    # Display name -> Id, for patient pickers
+    def ids_by_name(self):
+        self._ensure_loaded()
+        return {name: patient_id for patient_id, name in self.patients.values()}
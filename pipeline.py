@@ -0,0 +1,363 @@
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import islice
+import numpy as np
+from datetime import datetime
+from bp_predictor import BATCH_SIZE
+from preprocessing import DESIRED_NUM_VALUES, preprocess_signal, preprocess_signals
+from measure_journal import JOURNAL_COLUMNS, record_id
+from signal_quality import QUALITY_GATES, assess_signals
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = JOURNAL_COLUMNS
+# Recordings failing the signal quality checks are rejected before filtering
+# and inference ('reject'), predicted with their score ('flag') or not
+# assessed (None). The thresholds are calibrated on a single device
+# recording so far, so recordings are only flagged by default.
+QUALITY_GATE = 'flag'
+# Pools run_parallel can shard preprocessing over. Filtering and resampling
+# spend most of their time in numpy/scipy code that releases the GIL, so
+# threads scale too and avoid copying the samples to other processes.
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+# Assess the signal quality of a batch of records (see signal_quality.py) and
+# preprocess the samples of the ones the quality gate lets through, at once,
+# falling back to one record at a time so a single bad record is skipped.
+# sampling_rates holds the rate of each recording (None where unknown).
+# Returns the indices of the records kept, their model inputs and quality
+# scores, (index, reason) pairs for the others and the seconds spent.
+# Module-level so process pool workers can run it.
+def preprocess_samples(samples, input_length=DESIRED_NUM_VALUES, quality_gate=None, sampling_rates=None):
+    start_time = time.perf_counter()
+    candidates = list(range(len(samples)))
+    quality = np.full(len(samples), np.nan)
+    sampling_rates = sampling_rates or [None] * len(samples)
+    errors = []
+    if quality_gate:
+        assessment = assess_signals(samples, sampling_rates)
+        quality = assessment['score']
+        if quality_gate == 'reject':
+            candidates = [i for i in candidates if assessment['accepted'][i]]
+            errors = [(i, f"Low signal quality ({', '.join(failed)})")
+                      for i, failed in enumerate(assessment['failed']) if not assessment['accepted'][i]]
+
+    try:
+        scaled_signals = preprocess_signals([samples[i] for i in candidates], input_length,
+                                            [sampling_rates[i] for i in candidates])
+        kept = candidates
+    except Exception:
+        scaled_signals = np.empty((len(candidates), input_length), dtype=np.float32)
+        kept = []
+        for i in candidates:
+            try:
+                scaled_signals[len(kept)] = preprocess_signal(samples[i], input_length, sampling_rates[i])
+                kept.append(i)
+            except Exception as e:
+                errors.append((i, e))
+        scaled_signals = scaled_signals[:len(kept)]
+    return kept, scaled_signals, quality[kept], sorted(errors, key=lambda error: error[0]), time.perf_counter() - start_time
+
+# Seconds and records per pipeline stage, for throughput reports
+class StageTimes:
+    def __init__(self):
+        self.seconds = {}
+        self.records = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage, seconds, records):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.records[stage] = self.records.get(stage, 0) + records
+
+    # Stage seconds are summed over workers, so a parallel stage can report
+    # more seconds than the run took
+    def report(self):
+        wall_seconds = time.perf_counter() - self.started
+        report = {stage: {
+            'seconds': round(self.seconds[stage], 3),
+            'records': self.records[stage],
+            'records_per_second': round(self.records[stage] / self.seconds[stage], 1) if self.seconds[stage] else None,
+        } for stage in self.seconds}
+        records = max(self.records.values(), default=0)
+        report['total'] = {
+            'seconds': round(wall_seconds, 3),
+            'records': records,
+            'records_per_second': round(records / wall_seconds, 1) if wall_seconds else None,
+        }
+        return report
+
+# One predicted blood pressure reading
+class MeasurementResult:
+    def __init__(self, timestamp, systolic, diastolic, device='', name='', record_id='', quality=None):
+        self.timestamp = timestamp
+        self.systolic = round(float(systolic), 3)
+        self.diastolic = round(float(diastolic), 3)
+        self.device = device
+        self.name = name
+        self.record_id = record_id
+        self.quality = None if quality is None or np.isnan(quality) else round(float(quality), 3)
+
+    def as_row(self):
+        return {
+            'Record_Id': self.record_id,
+            'Name': self.name,
+            'Date_of_Measurement': self.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'Systolic_Pressure': self.systolic,
+            'Diastolic_Pressure': self.diastolic,
+            'Device': self.device,
+            'Quality': self.quality,
+        }
+
+    def __repr__(self):
+        return f"MeasurementResult({self.timestamp}, {self.systolic}, {self.diastolic}, device={self.device!r})"
+
+# In-process acquire -> preprocess -> predict -> record pipeline. Measurements
+# are handed from stage to stage as numpy arrays and result objects; results
+# are only persisted when a MeasureJournal is given, as pending measures.
+class MeasurementPipeline:
+    # sampling_rates maps device ids to their sampling rate in Hz, with '' for
+    # records without a device id (see ble_hub.load_sampling_rates); the rate
+    # of devices not listed is derived from the recording length. With a
+    # PredictionCache, records seen before are not preprocessed or predicted again.
+    # With an IngestIndex, run/run_stream/run_parallel drop the records already
+    # taken in (a device resending its history) before anything else is done.
+    def __init__(self, predictor, journal=None, batch_size=BATCH_SIZE, quality_gate=QUALITY_GATE, sampling_rates=None,
+                 cache=None, ingest_index=None):
+        if quality_gate is not None and quality_gate not in QUALITY_GATES:
+            raise ValueError(f"Unknown quality gate {quality_gate!r}, expected one of {QUALITY_GATES} or None")
+        self.predictor = predictor
+        self.journal = journal
+        self.batch_size = batch_size
+        self.quality_gate = quality_gate
+        self.sampling_rates = sampling_rates or {}
+        self.cache = cache
+        self.ingest_index = ingest_index
+        self.last_samples = None  # Raw samples of the last new measure, to compare models on
+        self.last_skipped = []  # (timestamp, kind, reason) of the records left out of the last batch
+        self.stage_times = None  # Of the last run_parallel
+        self.in_flight = set()  # Ids of the records run_parallel is processing
+
+    # Records are (timestamp, samples) pairs, or (device_id, timestamp, samples) from the hub.
+    # Returns the records that passed the quality gate and could be preprocessed,
+    # their [N, input_length] model inputs and their quality scores.
+    def preprocess(self, records, device_id=''):
+        records = self._with_device(records, device_id)
+        kept, scaled_signals, quality, errors, seconds = self._preprocess_samples(records)
+        self._report_skipped(records, dict(errors))
+        return [records[i] for i in kept], scaled_signals, quality
+
+    @staticmethod
+    def _with_device(records, device_id):
+        return [tuple(record) if len(record) == 3 else (device_id,) + tuple(record) for record in records]
+
+    def _rates(self, records):
+        return [self.sampling_rates.get(record[0]) for record in records]
+
+    def _preprocess_args(self, records):
+        return [record[2] for record in records], self.predictor.input_length, self.quality_gate, self._rates(records)
+
+    def _preprocess_samples(self, records):
+        return preprocess_samples(*self._preprocess_args(records))
+
+    # Reasons are strings for quality rejections and exceptions for records
+    # that failed to process; kind tells them apart ('quality' or 'error')
+    def _report_skipped(self, records, reasons):
+        self.last_skipped = [(records[i][1], 'quality' if isinstance(reason, str) else 'error', str(reason))
+                             for i, reason in sorted(reasons.items())]
+        for timestamp, kind, reason in self.last_skipped:
+            logger.warning("Skipped measure %s (%s): %s", timestamp, kind, reason)
+
+    @staticmethod
+    def _result(record, systolic, diastolic, quality):
+        device, timestamp, samples = record
+        # Measurements taken live carry no device timestamp
+        timestamp = timestamp or datetime.now()
+        return MeasurementResult(timestamp, systolic, diastolic, device,
+                                 record_id=record_id(device, timestamp, samples), quality=quality)
+
+    # Only the records that passed the quality gate reach the model
+    def predict(self, records, scaled_signals, quality=None):
+        if quality is None:
+            quality = np.full(len(records), np.nan)
+        predictions = self.predictor.predict_batch(scaled_signals, batch_size=self.batch_size) if records else []
+        return [self._result(record, systolic, diastolic, score)
+                for record, (systolic, diastolic), score in zip(records, predictions, quality)]
+
+    # Readings already in the journal (a repeated transfer) are not added twice
+    def record(self, results):
+        if self.journal is not None and results:
+            self.journal.add_pending([result.as_row() for result in results])
+
+    # Split records into the ones with a cached result and the ones to compute.
+    # Returns the cache keys, the cached entries by record index and the
+    # indices of the others.
+    def _lookup(self, records):
+        if self.cache is None:
+            return None, {}, list(range(len(records)))
+        model_id = self.predictor.model_id
+        keys = [self.cache.key(model_id, samples, rate, self.quality_gate)
+                for (device, timestamp, samples), rate in zip(records, self._rates(records))]
+        found = self.cache.get_many(keys)
+        cached = {i: found[key] for i, key in enumerate(keys) if key in found}
+        return keys, cached, [i for i in range(len(records)) if i not in cached]
+
+    # Predict the preprocessed records that were not cached, cache their
+    # results and quality rejections, and return every result in record
+    # order. Preprocessing errors (exceptions) are not cached, so those
+    # records are tried again next time.
+    def _finish(self, records, keys, cached, misses, preprocessed):
+        kept, scaled_signals, quality, errors, seconds = preprocessed
+        predicted = self.predict([records[misses[i]] for i in kept], scaled_signals, quality)
+        results = {misses[i]: result for i, result in zip(kept, predicted)}
+        reasons = {misses[i]: e for i, e in errors}
+
+        if self.cache is not None:
+            self.cache.put_many(
+                [(keys[i], result.systolic, result.diastolic, result.quality, None) for i, result in results.items()] +
+                [(keys[misses[i]], None, None, None, e) for i, e in errors if isinstance(e, str)])
+            for i, (systolic, diastolic, score, rejected) in cached.items():
+                if rejected:
+                    reasons[i] = rejected
+                else:
+                    results[i] = self._result(records[i], systolic, diastolic, score)
+
+        self._report_skipped(records, reasons)
+        return [results[i] for i in sorted(results)]
+
+    def process(self, records, device_id=''):
+        records = self._with_device(records, device_id)
+        keys, cached, misses = self._lookup(records)
+        preprocessed = self._preprocess_samples([records[i] for i in misses])
+        return self._finish(records, keys, cached, misses, preprocessed)
+
+    # Drop the records already ingested, in_flight (ids of records being
+    # processed) or repeated within records. Returns the new records and their
+    # ids. Live measures carry no device timestamp and are never duplicates.
+    def _new_records(self, records, in_flight=()):
+        if self.ingest_index is None:
+            return records, []
+        ids = [record_id(device, timestamp, samples) if timestamp else None for device, timestamp, samples in records]
+        keyed = [i for i, record in enumerate(ids) if record is not None]
+        seen = self.ingest_index.seen([ids[i] for i in keyed])
+        duplicates = {i for i, was_seen in zip(keyed, seen) if was_seen}
+        batch_ids = set()
+        for i in keyed:
+            if ids[i] in batch_ids or ids[i] in in_flight:
+                duplicates.add(i)
+            batch_ids.add(ids[i])
+        kept = [i for i in range(len(records)) if i not in duplicates]
+        return [records[i] for i in kept], [ids[i] for i in kept if ids[i] is not None]
+
+    # Only the records that produced a result are marked, once it is recorded:
+    # a record lost to a crash, rejected by the quality gate or failing
+    # preprocessing is taken in again when the device resends it
+    def _mark_ingested(self, ids, results):
+        if self.ingest_index is not None:
+            recorded = {result.record_id for result in results}
+            self.ingest_index.add([record for record in ids if record in recorded])
+
+    def run(self, records, device_id=''):
+        records, ids = self._new_records(self._with_device(records, device_id))
+        results = self.process(records)
+        self.record(results)
+        self._mark_ingested(ids, results)
+        return results
+
+    # Run over an iterator of records in batches of at most batch_size, recording
+    # each batch before reading on, so only one batch of raw samples is held at
+    # a time. Yields the results as they are recorded.
+    def run_stream(self, records, device_id='', batch_size=None):
+        batch_size = batch_size or self.batch_size
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield from self.run(batch, device_id)
+                batch = []
+        if batch:
+            yield from self.run(batch, device_id)
+
+    # Like run_stream, with preprocessing sharded over a pool of workers (threads
+    # or processes) while this thread runs the single model instance: batches
+    # are read in order, looked up in the cache, handed to the pool, and their
+    # preprocessed inputs are taken back from a queue of at most 2 * workers
+    # batches in the same order, then predicted and recorded. Results come out
+    # in input order and self.stage_times has the throughput of each stage.
+    def run_parallel(self, records, device_id='', workers=None, executor='thread', batch_size=None):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor {executor!r}, expected one of {sorted(EXECUTORS)}")
+        batch_size = batch_size or self.batch_size
+        workers = workers or os.cpu_count() or 1
+        self.stage_times = StageTimes()
+        queue = deque()
+        self.in_flight = set()
+
+        with EXECUTORS[executor](max_workers=workers) as pool:
+            try:
+                for batch in self._read_batches(records, device_id, batch_size):
+                    start_time = time.perf_counter()
+                    received = len(batch)
+                    batch, ids = self._new_records(batch, self.in_flight)
+                    self.in_flight.update(ids)
+                    self.stage_times.add('dedup', time.perf_counter() - start_time, received)
+
+                    start_time = time.perf_counter()
+                    keys, cached, misses = self._lookup(batch)
+                    self.stage_times.add('cache', time.perf_counter() - start_time, len(batch))
+                    future = pool.submit(preprocess_samples, *self._preprocess_args([batch[i] for i in misses]))
+                    queue.append((batch, ids, keys, cached, misses, future))
+                    if len(queue) >= 2 * workers:
+                        yield from self._predict_preprocessed(*queue.popleft())
+                while queue:
+                    yield from self._predict_preprocessed(*queue.popleft())
+            finally:
+                for *batch, future in queue:
+                    future.cancel()
+
+    # Batches of records, timing the reads from the source
+    def _read_batches(self, records, device_id, batch_size):
+        records = iter(records)
+        while True:
+            start_time = time.perf_counter()
+            batch = self._with_device(islice(records, batch_size), device_id)
+            self.stage_times.add('read', time.perf_counter() - start_time, len(batch))
+            if not batch:
+                return
+            yield batch
+
+    def _predict_preprocessed(self, batch, ids, keys, cached, misses, future):
+        preprocessed = future.result()
+        self.stage_times.add('preprocess', preprocessed[4], len(misses))
+
+        start_time = time.perf_counter()
+        results = self._finish(batch, keys, cached, misses, preprocessed)
+        self.stage_times.add('predict', time.perf_counter() - start_time, len(preprocessed[0]))
+
+        start_time = time.perf_counter()
+        self.record(results)
+        self._mark_ingested(ids, results)
+        self.in_flight.difference_update(ids)
+        self.stage_times.add('record', time.perf_counter() - start_time, len(results))
+        return results
+
+    # Acquire from any source with a matching method (BleSessionManager, BleHub) and run
+    def run_new_measure(self, source):
+        self.last_skipped = []
+        measurements = source.new_measure()
+        if not measurements:
+            return None
+        # The device may split the samples over several lists; join them in order
+        samples = np.concatenate([samples for timestamp, samples in measurements])
+        self.last_samples = samples
+        results = self.run([(measurements[0][0], samples)])
+        return results[0] if results else None
+
+    # Stored measures are streamed from the source and recorded batch by batch
+    def run_request_measures(self, source):
+        return list(self.run_stream(source.stream_measures()))
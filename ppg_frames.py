@@ -0,0 +1,99 @@
+import struct
+import zlib
+import numpy as np
+from datetime import datetime, timedelta
+from ppg_parser import MAX_SAMPLES
+
+# Binary measurement frame, little-endian:
+#   magic 'PF' | version u8 | sample width u8 (2 or 4) | timestamp u32 |
+#   sample count u32 | CRC-32 of payload u32 | payload (int16 or int32 samples)
+# The timestamp is the device wall clock in seconds since 1970-01-01, 0 when
+# the measurement has none (new_measure). A transfer is a run of frames
+# followed by the END_OF_TRANSFER byte.
+FRAME_MAGIC = b'PF'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<2sBBIII')
+SAMPLE_DTYPES = {2: np.dtype('<i2'), 4: np.dtype('<i4')}
+END_OF_TRANSFER = 0x04
+EPOCH = datetime(1970, 1, 1)
+
+def encode_frame(timestamp, samples, sample_width=None):
+    samples = np.asarray(samples)
+    if sample_width is None:
+        fits_int16 = len(samples) == 0 or (samples.min() >= -32768 and samples.max() <= 32767)
+        sample_width = 2 if fits_int16 else 4
+    payload = samples.astype(SAMPLE_DTYPES[sample_width]).tobytes()
+    seconds = int((timestamp - EPOCH).total_seconds()) if timestamp is not None else 0
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, sample_width, seconds, len(samples), zlib.crc32(payload))
+    return header + payload
+
+# Incremental frame decoder. Payload bytes are copied straight from the
+# notification chunks into the numpy array that is returned, and the CRC is
+# updated as they arrive. Frames that fail the CRC are dropped and described
+# in self.errors; self.finished is set once END_OF_TRANSFER is seen.
+class FrameDecoder:
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.max_samples = max_samples
+        self.errors = []
+        self.finished = False
+        self.header = bytearray()
+        self.samples = None
+
+    def _start_frame(self):
+        magic, version, sample_width, seconds, sample_count, crc = FRAME_HEADER.unpack(bytes(self.header))
+        self.header = bytearray()
+        if magic != FRAME_MAGIC or version != FRAME_VERSION or sample_width not in SAMPLE_DTYPES:
+            raise ValueError(f"Invalid frame header: {magic!r} v{version} width {sample_width}")
+        if sample_count > self.max_samples:
+            raise ValueError(f"Frame exceeds {self.max_samples} samples")
+        self.timestamp = EPOCH + timedelta(seconds=seconds) if seconds else None
+        self.expected_crc = crc
+        self.crc = 0
+        self.samples = np.empty(sample_count, dtype=SAMPLE_DTYPES[sample_width])
+        self.payload = self.samples.view(np.uint8)
+        self.filled = 0
+
+    def _finish_frame(self, measurements):
+        if self.crc == self.expected_crc:
+            measurements.append((self.timestamp, self.samples))
+        else:
+            self.errors.append((self.timestamp, "CRC mismatch"))
+        self.samples = None
+
+    def feed(self, chunk):
+        chunk = memoryview(bytes(chunk) if not isinstance(chunk, bytes) else chunk)
+        measurements = []
+        position = 0
+        while position < len(chunk) and not self.finished:
+            if self.samples is None:
+                if not self.header and chunk[position] == END_OF_TRANSFER:
+                    self.finished = True
+                    break
+                needed = FRAME_HEADER.size - len(self.header)
+                self.header += chunk[position:position + needed]
+                position += needed
+                if len(self.header) < FRAME_HEADER.size:
+                    break
+                try:
+                    self._start_frame()
+                except ValueError as e:
+                    # Framing is lost, so the rest of the transfer cannot be trusted
+                    self.errors.append((None, str(e)))
+                    self.finished = True
+                    break
+                if len(self.samples) == 0:
+                    self._finish_frame(measurements)
+                continue
+
+            size = min(len(self.payload) - self.filled, len(chunk) - position)
+            data = chunk[position:position + size]
+            self.payload[self.filled:self.filled + size] = data
+            self.crc = zlib.crc32(data, self.crc)
+            self.filled += size
+            position += size
+            if self.filled == len(self.payload):
+                self._finish_frame(measurements)
+        return measurements
+
+def is_binary_transfer(first_chunk):
+    return bytes(first_chunk[:len(FRAME_MAGIC)]) == FRAME_MAGIC
@@ -0,0 +1,159 @@
+import warnings
+import numpy as np
+from datetime import datetime
+
+# Upper bound on samples per measurement, so a corrupt stream cannot grow without limit
+MAX_SAMPLES = 100000
+SEPARATORS = ' ,\t\r\n'
+
+# Incremental parser for the textual payloads sent by the device.
+#
+# It accepts both formats the firmware produces, chunk by chunk, without
+# joining the chunks into one string first:
+#   new_measure:      [28694, 28686, ...]  (nested lists are flattened)
+#   request_measures: (2024-06-17 15:04:37, [28694, 28686, ...])(...)
+# Every complete measurement is returned by feed() as a (timestamp, samples)
+# pair, with samples as an int64 numpy array and timestamp None when the
+# payload does not carry one. Malformed or oversized measurements are
+# dropped and described in self.errors.
+class MeasurementParser:
+    OUTSIDE, TIMESTAMP, SAMPLES, CLOSING = range(4)
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.max_samples = max_samples
+        self.errors = []
+        self.reset()
+
+    def reset(self):
+        self.state = self.OUTSIDE
+        self.timestamp_text = ''
+        self.timestamp = None
+        self.has_timestamp = False
+        self.pending = ''  # Digits of a number split across two chunks
+        self.depth = 0
+        self.parts = []
+        self.num_samples = 0
+        self.error = None
+
+    def _add_numbers(self, text):
+        text = text.strip(SEPARATORS)
+        if not text or self.error:
+            return
+        try:
+            # numpy only warns when the text is not entirely numbers
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', DeprecationWarning)
+                values = np.fromstring(text, dtype=np.int64, sep=',')
+        except (ValueError, DeprecationWarning) as e:
+            self.error = f"Invalid samples: {e}"
+            return
+        self.num_samples += len(values)
+        if self.num_samples > self.max_samples:
+            self.error = f"Measurement exceeds {self.max_samples} samples"
+            self.parts = []
+            return
+        self.parts.append(values)
+
+    def _finish(self, measurements):
+        if self.error:
+            self.errors.append((self.timestamp, self.error))
+        else:
+            samples = np.concatenate(self.parts) if self.parts else np.empty(0, dtype=np.int64)
+            measurements.append((self.timestamp, samples))
+        self.reset()
+
+    def feed(self, chunk):
+        if isinstance(chunk, (bytes, bytearray)):
+            chunk = chunk.decode()
+
+        measurements = []
+        position = 0
+        length = len(chunk)
+        while position < length:
+            if self.state == self.OUTSIDE:
+                # Skip anything between measurements until a record starts
+                starts = [i for i in (chunk.find('(', position), chunk.find('[', position)) if i >= 0]
+                if not starts:
+                    break
+                position = min(starts)
+                if chunk[position] == '(':
+                    self.state = self.TIMESTAMP
+                    self.has_timestamp = True
+                else:
+                    self.state = self.SAMPLES
+                    self.depth = 1
+                position += 1
+
+            elif self.state == self.TIMESTAMP:
+                end = chunk.find('[', position)
+                if end < 0:
+                    self.timestamp_text += chunk[position:]
+                    break
+                self.timestamp_text += chunk[position:end]
+                timestamp_str = self.timestamp_text.strip(SEPARATORS).strip('\'"')
+                try:
+                    self.timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
+                except ValueError as e:
+                    self.error = f"Invalid timestamp: {e}"
+                self.state = self.SAMPLES
+                self.depth = 1
+                position = end + 1
+
+            elif self.state == self.SAMPLES:
+                # Numbers run until the next bracket; nested lists are flattened
+                opening = chunk.find('[', position)
+                closing = chunk.find(']', position)
+                brackets = [i for i in (opening, closing) if i >= 0]
+                if not brackets:
+                    text = self.pending + chunk[position:]
+                    # Keep the trailing, possibly incomplete, number for the next chunk
+                    cut = text.rfind(',')
+                    self._add_numbers(text[:cut + 1])
+                    self.pending = text[cut + 1:]
+                    break
+                end = min(brackets)
+                self._add_numbers(self.pending + chunk[position:end])
+                self.pending = ''
+                self.depth += 1 if chunk[end] == '[' else -1
+                position = end + 1
+                if self.depth == 0:
+                    if self.has_timestamp:
+                        self.state = self.CLOSING
+                    else:
+                        self._finish(measurements)
+
+            elif self.state == self.CLOSING:
+                end = chunk.find(')', position)
+                if end < 0:
+                    break
+                position = end + 1
+                self._finish(measurements)
+
+        return measurements
+
+# Parse a complete payload (or an iterable of chunks) in one call
+def parse_measurements(chunks, max_samples=MAX_SAMPLES):
+    if isinstance(chunks, (str, bytes, bytearray)):
+        chunks = [chunks]
+    parser = MeasurementParser(max_samples)
+    measurements = []
+    for chunk in chunks:
+        measurements.extend(parser.feed(chunk))
+    return measurements
+
+# Stream a text file through the parser in fixed-size reads
+def parse_measurement_file(file_path, chunk_size=65536, max_samples=MAX_SAMPLES):
+    parser = MeasurementParser(max_samples)
+    with open(file_path, 'r') as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield from parser.feed(chunk)
+    for timestamp, error in parser.errors:
+        print(f"Error processing measure {timestamp}: {error}")
+
+# Format a measurement the way requested_measures.txt stores it
+def format_measurement(timestamp, samples):
+    values = ', '.join(str(value) for value in np.asarray(samples).tolist())
+    return f"({timestamp.strftime('%Y-%m-%d %H:%M:%S')}, [{values}])"
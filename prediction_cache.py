@@ -0,0 +1,128 @@
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from preprocessing import PREPROCESSING_VERSION, RESAMPLER
+from signal_quality import QUALITY_VERSION, QUALITY_THRESHOLDS
+
+CACHE_FILE = "predictions.db"
+# Bytes of database pages in use kept on disk (about 150 bytes per entry);
+# the least recently used entries are evicted beyond this
+MAX_BYTES = 32 * 2**20
+# Share of MAX_BYTES left after an eviction, so evictions come in batches
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    Key TEXT PRIMARY KEY,
+    Systolic_Pressure REAL,
+    Diastolic_Pressure REAL,
+    Quality REAL,
+    Rejected TEXT,
+    Last_Used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (Last_Used);
+"""
+
+# On-disk LRU cache of pipeline results, keyed by a hash of everything that
+# decides them: the model (BPPredictor.model_id), the preprocessing version,
+# the quality gate with the version and thresholds of the checks, the sampling
+# rate and the raw samples. A record received again, in the same or a later
+# transfer, costs a hash and a lookup instead of filtering and inference.
+# Records the quality gate rejected are cached with the reason. Recency is a
+# counter stored with each entry, so it survives restarts.
+class PredictionCache:
+    def __init__(self, cache_file=CACHE_FILE, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.clock, self.entries = self.connection.execute(
+            "SELECT COALESCE(MAX(Last_Used), 0), COUNT(*) FROM predictions").fetchone()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model_id, samples, sampling_rate=None, quality_gate=None):
+        digest = hashlib.sha1(f"{model_id}|{PREPROCESSING_VERSION}-{RESAMPLER}|{quality_gate}-{QUALITY_VERSION}-"
+                              f"{QUALITY_THRESHOLDS}|{sampling_rate}|".encode())
+        digest.update(np.ascontiguousarray(samples, dtype=np.int64).tobytes())
+        return digest.hexdigest()
+
+    # Cached (systolic, diastolic, quality, rejected) per key found
+    def get_many(self, keys):
+        with self.lock:
+            self.clock += 1
+            found = {}
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                for row in self.connection.execute(
+                        f"SELECT Key, Systolic_Pressure, Diastolic_Pressure, Quality, Rejected FROM predictions "
+                        f"WHERE Key IN ({placeholders})", chunk):
+                    found[row[0]] = row[1:]
+                with self.connection:
+                    self.connection.execute(f"UPDATE predictions SET Last_Used = ? WHERE Key IN ({placeholders})",
+                                            [self.clock] + chunk)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+    def _existing(self, keys):
+        existing = set()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            existing.update(row[0] for row in self.connection.execute(
+                f"SELECT Key FROM predictions WHERE Key IN ({', '.join('?' * len(chunk))})", chunk))
+        return existing
+
+    # Bytes of the database pages in use (pages freed by evictions are reused)
+    def size_bytes(self):
+        page_count = self.connection.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = self.connection.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - free_pages) * self.connection.execute("PRAGMA page_size").fetchone()[0]
+
+    # entries: (key, systolic, diastolic, quality, rejected) tuples
+    def put_many(self, entries):
+        if not entries:
+            return
+        with self.lock:
+            self.clock += 1
+            rows = {entry[0]: tuple(entry) + (self.clock,) for entry in entries}
+            with self.connection:
+                new = len(rows) - len(self._existing(list(rows)))
+                self.connection.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)", list(rows.values()))
+            self.entries += new
+            size = self.size_bytes()
+            if size > self.max_bytes:
+                self._evict(self.entries - int(self.entries * EVICT_TO * self.max_bytes / size))
+
+    def _evict(self, count):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM predictions WHERE Key IN (SELECT Key FROM predictions ORDER BY Last_Used LIMIT ?)", (count,))
+        self.evictions += count
+        self.entries -= count
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'entries': self.entries,
+            'bytes': self.size_bytes(),
+            'evictions': self.evictions,
+        }
+
+    def clear(self):
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM predictions")
+            self.entries = 0
+
+    def close(self):
+        self.connection.close()
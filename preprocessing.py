@@ -0,0 +1,135 @@
+import numpy as np
+from fractions import Fraction
+from functools import lru_cache
+from scipy.signal import cheby2, filtfilt, firwin, resample_poly
+from scipy.interpolate import interp1d
+
+# Model input length and bandpass corners shared by every predictor
+DESIRED_NUM_VALUES = 1250
+LOWCUT = 0.5
+HIGHCUT = 8.0
+# Length of the model input window. When a recording's sampling rate is not
+# known it is assumed to span one window, so the rate follows the sample count.
+WINDOW_SECONDS = 10
+# Raw peak-to-peak range, in ADC units, at or below which a recording is flat
+# (a constant level, or one count of quantization noise). Filtering such a
+# recording leaves only rounding noise, which scaling would amplify to 0-1.
+FLAT_RANGE = 1
+# 'polyphase' resamples from the recording's rate to the model's rate
+# (input length / WINDOW_SECONDS); 'cubic' stretches the recording over the
+# model input by cubic interpolation, as the models were trained. Polyphase
+# inputs differ from cubic ones by up to 0.047 (new_measure.txt at 81 Hz), so
+# cubic stays the default until the models are validated on them.
+RESAMPLERS = ('polyphase', 'cubic')
+RESAMPLER = 'cubic'
+# Bumped whenever a change alters the model inputs, which invalidates the
+# prediction cache (see prediction_cache.py)
+PREPROCESSING_VERSION = 3
+# Largest denominator of the up/down resampling ratio
+MAX_RATIO_DENOMINATOR = 1000
+# Smallest batch cubic resampling goes through the cached interpolation
+# matrix for; smaller batches fit the splines directly, which costs O(n) per
+# signal instead of the matrix's n x input length product and its construction
+MATRIX_MIN_BATCH = 1024
+
+# 4th order Chebyshev-II bandpass coefficients, designed once per sampling rate
+@lru_cache(maxsize=32)
+def bandpass_coefficients(fs):
+    nyquist = 0.5 * fs
+    low = LOWCUT / nyquist
+    high = HIGHCUT / nyquist
+    return cheby2(4, 40, [low, high], btype='bandpass')
+
+# Cubic interpolation is linear in the samples, so resampling a whole batch is a
+# single matrix product with the interpolation of the identity matrix
+@lru_cache(maxsize=8)
+def resample_matrix(num_values, desired_num_values=DESIRED_NUM_VALUES):
+    x = np.linspace(0, 1, num=num_values)  # Normalized time axis
+    x_new = np.linspace(0, 1, num=desired_num_values)  # New normalized time axis
+    f = interp1d(x, np.eye(num_values), kind='cubic', axis=0)  # Cubic interpolation
+    return np.ascontiguousarray(f(x_new).T)
+
+# Stretch [N, num_values] signals over desired_num_values samples by cubic
+# interpolation, fitting one spline per signal, or through resample_matrix for
+# batches of at least MATRIX_MIN_BATCH signals
+def resample_cubic(signals, desired_num_values=DESIRED_NUM_VALUES):
+    num_signals, num_values = signals.shape
+    if num_signals >= MATRIX_MIN_BATCH:
+        return signals @ resample_matrix(num_values, desired_num_values)
+    x = np.linspace(0, 1, num=num_values)
+    x_new = np.linspace(0, 1, num=desired_num_values)
+    return interp1d(x, signals, kind='cubic', axis=1)(x_new)
+
+# Smallest up/down factors taking fs to target_fs
+@lru_cache(maxsize=32)
+def resample_ratio(fs, target_fs):
+    ratio = Fraction(target_fs / fs).limit_denominator(MAX_RATIO_DENOMINATOR)
+    return ratio.numerator, ratio.denominator
+
+# Anti-aliasing filter bank of resample_poly for an up/down ratio (the same
+# Kaiser-windowed FIR it would design on every call), designed once per ratio
+@lru_cache(maxsize=32)
+def polyphase_filter(up, down):
+    max_rate = max(up, down)
+    return firwin(2 * 10 * max_rate + 1, 1 / max_rate, window=('kaiser', 5.0))
+
+# Resample [N, num_values] signals sampled at fs to the model rate and return
+# the first desired_num_values samples; a recording shorter than the window
+# is padded with its last value
+def resample_polyphase(signals, fs, desired_num_values=DESIRED_NUM_VALUES):
+    up, down = resample_ratio(fs, desired_num_values / WINDOW_SECONDS)
+    if up == down:
+        resampled = signals
+    else:
+        resampled = resample_poly(signals, up, down, axis=1, window=polyphase_filter(up, down), padtype='line')
+    if resampled.shape[1] < desired_num_values:
+        resampled = np.pad(resampled, ((0, 0), (0, desired_num_values - resampled.shape[1])), mode='edge')
+    return resampled[:, :desired_num_values]
+
+# Filter, resample and scale a [N, num_values] array of raw PPG signals of equal
+# length and sampling rate fs (num_values / WINDOW_SECONDS when not given)
+def preprocess_batch(signals, desired_num_values=DESIRED_NUM_VALUES, fs=None, resampler=RESAMPLER):
+    if resampler not in RESAMPLERS:
+        raise ValueError(f"Unknown resampler {resampler!r}, expected one of {RESAMPLERS}")
+    ppg_signals = np.atleast_2d(np.asarray(signals, dtype=np.float64)) * -1
+    num_values = ppg_signals.shape[1]
+    flat = np.ptp(ppg_signals, axis=1, keepdims=True) <= FLAT_RANGE
+    fs = fs or num_values / WINDOW_SECONDS
+
+    # Apply the bandpass filter to every signal at once
+    b, a = bandpass_coefficients(fs)
+    filtered_signals = filtfilt(b, a, ppg_signals, axis=1)
+
+    # Bring the signals to the model input length
+    if resampler == 'polyphase':
+        interpolated_signals = resample_polyphase(filtered_signals, fs, desired_num_values)
+    else:
+        interpolated_signals = resample_cubic(filtered_signals, desired_num_values)
+
+    # Scale each signal between 0 and 1; a flat signal scales to zeros
+    minimum = interpolated_signals.min(axis=1, keepdims=True)
+    value_range = interpolated_signals.max(axis=1, keepdims=True) - minimum
+    scaled_signals = np.divide(interpolated_signals - minimum, value_range,
+                               out=np.zeros_like(interpolated_signals), where=~flat & (value_range > 0))
+
+    return scaled_signals.astype(np.float32)
+
+# Preprocess signals of possibly different lengths and sampling rates (one
+# rate for all, one per signal or None to derive it), batching the signals
+# that share both
+def preprocess_signals(signals, desired_num_values=DESIRED_NUM_VALUES, sampling_rates=None, resampler=RESAMPLER):
+    scaled_signals = np.empty((len(signals), desired_num_values), dtype=np.float32)
+    if sampling_rates is None or np.isscalar(sampling_rates):
+        sampling_rates = [sampling_rates] * len(signals)
+
+    groups = {}
+    for i, (signal, fs) in enumerate(zip(signals, sampling_rates)):
+        groups.setdefault((len(signal), fs), []).append(i)
+
+    for (num_values, fs), indices in groups.items():
+        batch = np.array([signals[i] for i in indices])
+        scaled_signals[indices] = preprocess_batch(batch, desired_num_values, fs, resampler)
+    return scaled_signals
+
+def preprocess_signal(ppg_samples, desired_num_values=DESIRED_NUM_VALUES, fs=None, resampler=RESAMPLER):
+    return preprocess_batch([ppg_samples], desired_num_values, fs, resampler)[0]
@@ -0,0 +1,135 @@
+import numpy as np
+from preprocessing import LOWCUT, HIGHCUT, WINDOW_SECONDS
+
+# Acceptance thresholds of the signal quality checks
+MIN_PERFUSION_INDEX = 0.05  # Pulsatile over static amplitude, in percent
+MAX_CLIPPING_RATIO = 0.05  # Share of samples stuck at the recording's extremes
+MIN_BAND_POWER_RATIO = 0.4  # Share of the power above LOWCUT that lies within LOWCUT-HIGHCUT
+MIN_TEMPLATE_CORRELATION = 0.4  # Mean correlation of each beat with the average beat
+QUALITY_GATES = ('reject', 'flag')
+QUALITY_THRESHOLDS = (MIN_PERFUSION_INDEX, MAX_CLIPPING_RATIO, MIN_BAND_POWER_RATIO, MIN_TEMPLATE_CORRELATION)
+# Bumped whenever the checks change, which invalidates the cached rejections
+# (see prediction_cache.py)
+QUALITY_VERSION = 1
+
+# Signal quality of a [N, num_values] batch of raw PPG recordings of equal
+# length and sampling rate fs (num_values / WINDOW_SECONDS when not given),
+# computed for the whole batch at once:
+# - perfusion index: 5-95 percentile amplitude over the mean level, in percent;
+#   flat or nearly flat recordings have none
+# - clipping ratio: share of samples equal to the recording's minimum or
+#   maximum, which grows when the sensor saturates
+# - band power ratio: share of the power above LOWCUT that lies below
+#   HIGHCUT, and the heart rate at the spectral peak of that band. Baseline
+#   wander below LOWCUT, removed by the bandpass anyway, is left out: it
+#   holds most of the power of real recordings (75% in new_measure.txt).
+# - template correlation: the band-limited recording is cut into beats of the
+#   peak period and each beat correlated with their average
+# score combines them into a value between 0 and 1; accepted is True when
+# every check passes.
+def assess_batch(signals, fs=None):
+    signals = np.atleast_2d(np.asarray(signals, dtype=np.float64))
+    num_signals, num_values = signals.shape
+    fs = fs or num_values / WINDOW_SECONDS
+
+    level = signals.mean(axis=1)
+    low, high = np.percentile(signals, [5, 95], axis=1)
+    amplitude = high - low
+    perfusion_index = np.divide(100 * amplitude, np.abs(level), out=np.full(num_signals, np.inf), where=level != 0)
+    perfusion_index[amplitude == 0] = 0.0
+
+    minimum = signals.min(axis=1, keepdims=True)
+    maximum = signals.max(axis=1, keepdims=True)
+    clipping_ratio = np.minimum((signals == minimum).mean(axis=1) + (signals == maximum).mean(axis=1), 1.0)
+
+    spectrum = np.fft.rfft(signals - level[:, None], axis=1)
+    power = np.abs(spectrum) ** 2
+    frequencies = np.fft.rfftfreq(num_values, 1 / fs)
+    band = (frequencies >= LOWCUT) & (frequencies <= HIGHCUT)
+    total_power = power[:, frequencies >= LOWCUT].sum(axis=1)
+    band_power = power[:, band].sum(axis=1)
+    band_power_ratio = np.divide(band_power, total_power, out=np.zeros(num_signals), where=total_power > 0)
+
+    template_correlation = np.zeros(num_signals)
+    heart_rate = np.full(num_signals, np.nan)
+    if band.any():
+        # Peak bin refined by a parabola through it and its neighbours, since
+        # a 10 s window only resolves 0.1 Hz and beats drift off a rounded period
+        peak = np.flatnonzero(band)[0] + np.argmax(power[:, band], axis=1)
+        rows = np.arange(num_signals)
+        left = np.log(power[rows, np.maximum(peak - 1, 0)] + 1e-12)
+        centre = np.log(power[rows, peak] + 1e-12)
+        right = np.log(power[rows, np.minimum(peak + 1, len(frequencies) - 1)] + 1e-12)
+        curvature = left - 2 * centre + right
+        offset = np.divide(0.5 * (left - right), curvature, out=np.zeros(num_signals), where=curvature < 0)
+        peak_frequency = (peak + np.clip(offset, -0.5, 0.5)) * fs / num_values
+        heart_rate = 60 * peak_frequency
+        filtered = np.fft.irfft(spectrum * band, n=num_values, axis=1)
+        periods = np.maximum(np.rint(fs / peak_frequency).astype(np.int64), 1)
+        # Recordings sharing a beat period are cut into beats together
+        for period in np.unique(periods):
+            rows = np.flatnonzero(periods == period)
+            num_beats = num_values // period
+            if num_beats < 2:
+                continue
+            beats = filtered[rows, :num_beats * period].reshape(len(rows), num_beats, period)
+            beats = beats - beats.mean(axis=2, keepdims=True)
+            template = beats.mean(axis=1, keepdims=True)
+            norms = np.linalg.norm(beats, axis=2) * np.linalg.norm(template, axis=2)
+            correlations = np.divide((beats * template).sum(axis=2), norms, out=np.zeros(norms.shape), where=norms > 0)
+            template_correlation[rows] = correlations.mean(axis=1)
+
+    checks = {
+        'perfusion_index': perfusion_index >= MIN_PERFUSION_INDEX,
+        'clipping_ratio': clipping_ratio <= MAX_CLIPPING_RATIO,
+        'band_power_ratio': band_power_ratio >= MIN_BAND_POWER_RATIO,
+        'template_correlation': template_correlation >= MIN_TEMPLATE_CORRELATION,
+    }
+    accepted = np.logical_and.reduce(list(checks.values()))
+    score = np.clip(template_correlation, 0, 1) * band_power_ratio * (1 - clipping_ratio)
+    score[~checks['perfusion_index']] = 0.0
+
+    return {
+        'perfusion_index': perfusion_index,
+        'clipping_ratio': clipping_ratio,
+        'band_power_ratio': band_power_ratio,
+        'heart_rate': heart_rate,
+        'template_correlation': template_correlation,
+        'score': score,
+        'accepted': accepted,
+        'failed': [[name for name, passed in checks.items() if not passed[i]] for i in range(num_signals)],
+    }
+
+# assess_batch over recordings of possibly different lengths and sampling
+# rates (see preprocess_signals), batching those that share both. Recordings
+# too short to assess are rejected.
+def assess_signals(signals, sampling_rates=None):
+    num_signals = len(signals)
+    if sampling_rates is None or np.isscalar(sampling_rates):
+        sampling_rates = [sampling_rates] * num_signals
+    quality = {
+        'perfusion_index': np.zeros(num_signals),
+        'clipping_ratio': np.ones(num_signals),
+        'band_power_ratio': np.zeros(num_signals),
+        'heart_rate': np.full(num_signals, np.nan),
+        'template_correlation': np.zeros(num_signals),
+        'score': np.zeros(num_signals),
+        'accepted': np.zeros(num_signals, dtype=bool),
+        'failed': [['length'] for _ in range(num_signals)],
+    }
+
+    groups = {}
+    for i, (signal, fs) in enumerate(zip(signals, sampling_rates)):
+        groups.setdefault((len(signal), fs), []).append(i)
+
+    for (num_values, fs), indices in groups.items():
+        if num_values < 2 * WINDOW_SECONDS:
+            continue
+        batch_quality = assess_batch(np.array([signals[i] for i in indices]), fs)
+        for name, values in batch_quality.items():
+            if name == 'failed':
+                for i, failed in zip(indices, values):
+                    quality['failed'][i] = failed
+            else:
+                quality[name][indices] = values
+    return quality
@@ -0,0 +1,72 @@
+import asyncio
+import queue
+import threading
+
+POLL_INTERVAL = 0.01
+
+class _Done:
+    def __init__(self, error=None):
+        self.error = error
+
+# Iterate from synchronous code over an async iterable that runs on `loop` in
+# another thread. At most `window` items wait between the two threads: while
+# the consumer is busy the producer stops pulling from the async iterable,
+# which lets BleDevice.stream pause the device. Leaving the loop early cancels
+# the producer.
+def iterate_threadsafe(async_iterable, loop, window):
+    items = queue.Queue(maxsize=window)
+
+    async def put(item):
+        while True:
+            try:
+                items.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def produce():
+        try:
+            async for item in async_iterable:
+                await put(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await put(_Done(e))
+            return
+        finally:
+            # Close the source now, not when it is garbage collected
+            await async_iterable.aclose()
+        await put(_Done())
+
+    future = asyncio.run_coroutine_threadsafe(produce(), loop)
+    try:
+        while True:
+            item = items.get()
+            if isinstance(item, _Done):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        future.cancel()
+
+# Let every task left on the loop run its cleanup (e.g. disconnecting)
+async def _cancel_tasks():
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.get_event_loop().shutdown_asyncgens()
+
+# Same, on a private event loop thread that lives as long as the iteration
+def iterate_in_thread(async_iterable, window, name="stream"):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name=name, daemon=True)
+    thread.start()
+    try:
+        yield from iterate_threadsafe(async_iterable, loop, window)
+    finally:
+        asyncio.run_coroutine_threadsafe(_cancel_tasks(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
@@ -1,31 +1,66 @@
+import sys
+import numpy as np
 import pandas as pd
-from faker import Faker
 import random
+from functools import lru_cache
 
-# Initialize Faker to generate synthetic names and dates
-fake = Faker()
+# Faker generates the synthetic names and dates; it is created on first use,
+# so the PPG signals below do not need it
+@lru_cache(maxsize=1)
+def get_faker():
+    from faker import Faker
+    return Faker()
 
-# Parameters for synthetic data generation
-num_patients = 15
+COLUMNS = ['Id', 'Name', 'Date_of_Measurement', 'Systolic_Pressure', 'Diastolic_Pressure']
 
-# Generate synthetic data
-data = []
+# Generate synthetic data: 5 to 15 measurements per patient over the last year
+def generate_patients(num_patients=15):
+    fake = get_faker()
+    data = []
 
-for patient_id in range(1, num_patients + 1):
-    name = fake.name()
-    num_measurements = random.randint(5, 15)
-    for _ in range(num_measurements):
-        date_of_measurement = fake.date_time_between(start_date='-1y', end_date='now')
-        diastolic_pressure = random.randint(40, 120)
-        systolic_pressure = diastolic_pressure + random.randint(35, 65)
-        data.append([patient_id, name, date_of_measurement, systolic_pressure, diastolic_pressure])
+    for patient_id in range(1, num_patients + 1):
+        name = fake.name()
+        num_measurements = random.randint(5, 15)
+        for _ in range(num_measurements):
+            date_of_measurement = fake.date_time_between(start_date='-1y', end_date='now')
+            diastolic_pressure = random.randint(40, 120)
+            systolic_pressure = diastolic_pressure + random.randint(35, 65)
+            data.append([patient_id, name, date_of_measurement, systolic_pressure, diastolic_pressure])
 
-# Create DataFrame
-columns = ['Id', 'Name', 'Date_of_Measurement', 'Systolic_Pressure', 'Diastolic_Pressure']
-df = pd.DataFrame(data, columns=columns)
+    return pd.DataFrame(data, columns=COLUMNS)
 
-# Save to CSV
-csv_file = "data.csv"
-df.to_csv(csv_file, index=False)
+# The same distributions drawn as whole columns, for histories of millions of rows
+def generate_measurements(num_rows, num_patients=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    fake = get_faker()
+    names = np.array([fake.name() for _ in range(num_patients)], dtype=object)
+    ids = rng.integers(1, num_patients + 1, size=num_rows)
+    now = pd.Timestamp.now().floor('s')
+    dates = now - pd.to_timedelta(rng.integers(0, 365 * 86400, size=num_rows), unit='s')
+    diastolic = rng.integers(40, 121, size=num_rows)
+    return pd.DataFrame({
+        'Id': ids,
+        'Name': names[ids - 1],
+        'Date_of_Measurement': dates,
+        'Systolic_Pressure': diastolic + rng.integers(35, 66, size=num_rows),
+        'Diastolic_Pressure': diastolic,
+    }, columns=COLUMNS)
 
-print(f"Synthetic data saved to {csv_file}")
+# Synthetic raw PPG recordings shaped like the device output (10 s windows)
+def synthetic_ppg(num_signals, num_values=810, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 10, num_values)
+    heart_rate = rng.uniform(0.9, 1.8, size=(num_signals, 1))
+    signals = 28690 + 40 * np.sin(2 * np.pi * heart_rate * t) + rng.normal(0, 5, size=(num_signals, num_values))
+    return signals.astype(np.int64)
+
+if __name__ == "__main__":
+    # python synthetic_data_generator.py [num_patients]
+    num_patients = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    df = generate_patients(num_patients)
+
+    # Save to CSV
+    csv_file = "data.csv"
+    df.to_csv(csv_file, index=False)
+
+    print(f"Synthetic data saved to {csv_file}")
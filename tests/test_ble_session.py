@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("bleak")
+
+from ble_device import BleDevice, SERVICE_UUID, TX_CHARACTERISTIC_UUID, RX_CHARACTERISTIC_UUID
+from ble_session import BleSessionManager
+from ble_simulator import SimulatedPeripheral, simulated_client_factory
+
+# Starts sessions on simulated peripherals and stops them after the test
+@pytest.fixture
+def sessions():
+    started = []
+
+    def start(peripheral, **kwargs):
+        device = BleDevice(peripheral.address, SERVICE_UUID, TX_CHARACTERISTIC_UUID, RX_CHARACTERISTIC_UUID,
+                           simulated_client_factory(peripheral), verbose=False)
+        session = BleSessionManager(device, reconnect_delay=0.01, poll_interval=0.01, **kwargs).start()
+        started.append(session)
+        return session
+
+    yield start
+    for session in started:
+        session.stop()
+
+def test_connects_after_refused_attempts(sessions):
+    peripheral = SimulatedPeripheral("SIM:00", num_stored=3, fail_connects=2)
+    session = sessions(peripheral)
+    assert len(session.request_measures(timeout=1)) == 3
+    assert session.is_connected
+    assert peripheral.connect_count == 3
+
+def test_reconnects_after_the_link_drops(sessions):
+    peripheral = SimulatedPeripheral("SIM:00")
+    session = sessions(peripheral)
+    assert len(session.new_measure(timeout=1)) == 1
+    connects = peripheral.connect_count
+    peripheral.drop_connection()
+    assert len(session.new_measure(timeout=1)) == 1
+    assert peripheral.connect_count > connects
+
+def test_aborted_stream_leaves_the_session_usable(sessions):
+    peripheral = SimulatedPeripheral("SIM:00", num_stored=20, chunk_interval=0.001)
+    session = sessions(peripheral)
+    measurements = session.stream_measures(timeout=1, window=2)
+    next(measurements)
+    measurements.close()
+
+    # The rest of the abandoned transfer must not leak into the next reply
+    peripheral.stored = SimulatedPeripheral("SIM:01", num_stored=2).stored
+    assert len(session.request_measures(timeout=1)) == 2
+    assert session.is_connected
+
+def test_unreachable_device_raises_connection_error(sessions):
+    peripheral = SimulatedPeripheral("SIM:00", fail_connects=10 ** 6)
+    session = sessions(peripheral, connect_timeout=0.2)
+    with pytest.raises(ConnectionError):
+        session.new_measure(timeout=1)
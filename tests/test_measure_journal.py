@@ -0,0 +1,33 @@
+from measure_journal import MeasureJournal
+
+def measure(record_id, systolic=120.0, diastolic=80.0, name=''):
+    return {'Record_Id': record_id, 'Name': name, 'Date_of_Measurement': '2024-05-01 10:00:00',
+            'Systolic_Pressure': systolic, 'Diastolic_Pressure': diastolic, 'Device': 'SIM:00', 'Quality': 0.9}
+
+def test_compaction_forgets_committed_ids(tmp_path):
+    journal_file = str(tmp_path / "measures.journal")
+    journal = MeasureJournal(journal_file, fsync=False, compact_after=10)
+    for batch in range(10):
+        ids = [f"{batch}-{i}" for i in range(5)]
+        journal.add_pending([measure(record) for record in ids])
+        journal.name([measure(record, name='Patient 1') for record in ids])
+        journal.mark_committed(ids)
+    journal.add_pending([measure("live")])
+    assert len(journal.committed) < 10
+    journal.close()
+
+    with open(journal_file, encoding='utf-8') as file:
+        lines = file.readlines()
+    assert len(lines) <= 11
+    assert all('"committed"' not in line or '"0-0"' not in line for line in lines)
+    reopened = MeasureJournal(journal_file, fsync=False)
+    assert list(reopened.pending()['Record_Id']) == ["live"]
+    reopened.close()
+
+def test_rows_without_pressure_are_skipped(tmp_path):
+    journal = MeasureJournal(str(tmp_path / "measures.journal"), fsync=False)
+    assert journal.add_pending([measure("a"), measure("b", systolic=None)]) == 1
+    assert journal.name([measure("a", diastolic=float('nan'), name='Patient 1')]) == 0
+    assert list(journal.pending()['Record_Id']) == ["a"]
+    assert journal.name([measure("a", name='Patient 1')]) == 1
+    journal.close()
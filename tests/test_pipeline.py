@@ -0,0 +1,39 @@
+from datetime import datetime
+import numpy as np
+from pipeline import MeasurementPipeline
+from synthetic_data_generator import synthetic_ppg
+
+class FixedPredictor:
+    input_length = 1250
+
+    def predict_batch(self, scaled_signals, batch_size=None):
+        return [(120.0, 80.0)] * len(scaled_signals)
+
+class FakeSource:
+    def __init__(self, samples):
+        self.samples = samples
+
+    def new_measure(self):
+        return [(datetime(2024, 5, 1, 10), self.samples)]
+
+def test_new_measure_is_recorded():
+    pipeline = MeasurementPipeline(FixedPredictor())
+    result = pipeline.run_new_measure(FakeSource(synthetic_ppg(1)[0]))
+    assert (result.systolic, result.diastolic) == (120.0, 80.0)
+    assert pipeline.last_skipped == []
+
+def test_skipped_measure_is_a_quality_rejection():
+    pipeline = MeasurementPipeline(FixedPredictor(), quality_gate='reject')
+    assert pipeline.run_new_measure(FakeSource(np.full(810, 2000))) is None
+    assert [kind for timestamp, kind, reason in pipeline.last_skipped] == ['quality']
+
+def test_skipped_measure_is_a_processing_error():
+    pipeline = MeasurementPipeline(FixedPredictor(), quality_gate='flag')
+    assert pipeline.run_new_measure(FakeSource(np.arange(3))) is None
+    assert [kind for timestamp, kind, reason in pipeline.last_skipped] == ['error']
+
+def test_skipped_measure_is_logged(caplog):
+    pipeline = MeasurementPipeline(FixedPredictor(), quality_gate='reject')
+    pipeline.run_new_measure(FakeSource(np.full(810, 2000)))
+    assert [record.levelname for record in caplog.records] == ['WARNING']
+    assert "Skipped measure 2024-05-01 10:00:00 (quality)" in caplog.text
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pandas as pd
+
+from time_window import between, since, sort_by_time
+
+def measurements(dates):
+    return pd.DataFrame({'Date_of_Measurement': pd.Series(pd.to_datetime(dates), dtype='datetime64[s]')})
+
+def test_between_empty_frame_with_microsecond_bounds():
+    data = measurements([])
+    start = datetime(2024, 7, 1, 11, 0, 0, 123456)
+    assert between(data, 'Date_of_Measurement', start, datetime(2024, 7, 8, 20, 0, 0, 654321)).empty
+    assert since(data, 'Date_of_Measurement', start).empty
+
+def test_between_rounds_bounds_inwards():
+    data = measurements(['2024-07-01 11:00:00', '2024-07-01 11:00:01', '2024-07-01 11:00:02'])
+    window = between(data, 'Date_of_Measurement', datetime(2024, 7, 1, 11, 0, 0, 500000),
+                     datetime(2024, 7, 1, 11, 0, 1, 500000))
+    assert window['Date_of_Measurement'].tolist() == [pd.Timestamp('2024-07-01 11:00:01')]
+
+def test_between_inclusive_bounds_on_parsed_dates():
+    data = sort_by_time(pd.DataFrame({'Date_of_Measurement': ['2024-07-08 20:27:24', '2024-06-29 14:30:21']}),
+                        'Date_of_Measurement')
+    window = between(data, 'Date_of_Measurement', '2024-06-29 14:30:21', '2024-07-08 20:27:24')
+    assert len(window) == 2
@@ -0,0 +1,29 @@
+import pandas as pd
+
+# Parse and sort a time column once, when the data is loaded, so windows can
+# then be found by binary search
+def sort_by_time(data, time_column):
+    if not pd.api.types.is_datetime64_any_dtype(data[time_column]):
+        data = data.assign(**{time_column: pd.to_datetime(data[time_column])})
+    if not data[time_column].is_monotonic_increasing:
+        data = data.sort_values(time_column, kind='stable')
+    return data.reset_index(drop=True)
+
+# A bound in the unit of the time column (searchsorted refuses finer ones, e.g.
+# datetime.now() against a column of whole seconds), rounded up for a start
+# and down for an end so the rows within it stay in
+def _bound(times, value, rounding):
+    unit = times.dt.unit
+    return getattr(pd.Timestamp(value), rounding)(unit).as_unit(unit)
+
+# Rows of data (sorted by time_column) with start <= time <= end, either bound
+# optional. Positions come from searchsorted and the result is a slice of data,
+# so no rows are parsed, compared or copied.
+def between(data, time_column, start=None, end=None):
+    times = data[time_column]
+    first = times.searchsorted(_bound(times, start, 'ceil'), side='left') if start is not None else 0
+    last = times.searchsorted(_bound(times, end, 'floor'), side='right') if end is not None else len(data)
+    return data.iloc[first:last]
+
+def since(data, time_column, start):
+    return between(data, time_column, start)